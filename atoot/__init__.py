@@ -1,5 +1,6 @@
 from atoot.api import (
     MastodonAPI, client,
+    ResponseList, PageCursor,
     MastodonError,
     NetworkError,
     ApiError,
@@ -14,3 +15,9 @@ from atoot.api import (
     ServerError,
     UnavailableError
 )
+from atoot.ratelimit import RateLimiter
+from atoot.retry import RetryPolicy
+from atoot.cache import ResponseCache, ValidatorStore
+from atoot.pool import ClientPool
+from atoot.metrics import Metrics
+from atoot.transport import RecordingSession, ReplaySession
@@ -1,17 +1,33 @@
 #!/usr/bin/python3
 import asyncio
+import functools
 import uuid
 import time
 
-from collections import UserList
+from collections import UserList, namedtuple
 from urllib.parse import urlencode
 from contextlib import asynccontextmanager, suppress
 
 import aiohttp
 
+from atoot.ratelimit import RateLimiter
+from atoot.retry import RetryPolicy
+from atoot.cache import ResponseCache, ValidatorStore
+from atoot import codec
+from atoot.bulk import CHUNK_SIZES, bulk, chunk_size_for
+from atoot.media import Upload
+from atoot.metrics import Metrics
+from atoot.models import Entity, model_for, to_models
+from atoot.streaming import (SSE_PATHS, Batcher, EventStream, ManagedStream,
+                             StreamMultiplexer, run_workers)
+
 __useragent__ = "atoot/1.x; (+https://github.com/popura-network/atoot)"
 SCOPES = 'read write follow'
 REDIRECT_URI = 'urn:ietf:wg:oauth:2.0:oob'
+_MISSING = object()
+# Headers which are not stored in the pagination RequestTemplate
+_TRANSIENT_HEADERS = frozenset(("Authorization", "Content-Type", 
+                                "If-None-Match", "If-Modified-Since"))
 
 def str_bool(b):
     """Convert boolean to a string, in the way expected by the API."""
@@ -21,25 +37,65 @@ def get_id(item):
     """Return id of an item if it's a dict"""
     if type(item) == dict and "id" in item:
         return item["id"]
+    elif isinstance(item, Entity):
+        return item.id
     else:
         return item
 
+class RequestTemplate(namedtuple("RequestTemplate", ("method", "headers"))):
+    """Request options shared by all pages of paginated results: HTTP method
+    and extra headers, without the access token"""
+    __slots__ = ()
+
+    def request_headers(self):
+        return dict(self.headers)
+
+
+class PageCursor(namedtuple("PageCursor", ("next", "previous", "template"))):
+    """Position in paginated results: paths of the next and previous pages.
+
+    Cursors are immutable and can be serialized with :meth:`to_dict` to 
+    resume a crawl later with :meth:`MastodonAPI.get_next` or 
+    :meth:`MastodonAPI.paginate`.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {"next": self.next, "previous": self.previous,
+                "method": self.template.method, 
+                "headers": [list(h) for h in self.template.headers]}
+
+    @classmethod
+    def from_dict(cls, data):
+        template = RequestTemplate(data.get("method", "GET"), 
+                tuple(tuple(h) for h in data.get("headers", ())))
+        return cls(data.get("next"), data.get("previous"), template)
+
+
 class ResponseList(UserList):
     """List-like datatype for Mastodon API results pagination"""
 
-    def __init__(self, data, method=None, **kwargs):
-        self.data = data
-        self.method = method
-        self.kwargs = kwargs
-        self.next = None
-        self.previous = None
+    def __init__(self, data=None, cursor=None):
+        self.data = data if type(data) == list else list(data or ())
+        self.cursor = cursor
+
+    @property
+    def next(self):
+        return self.cursor.next if self.cursor else None
+
+    @property
+    def previous(self):
+        return self.cursor.previous if self.cursor else None
 
 
 class MastodonAPI:
 
     @classmethod
     async def create(cls, instance, client_id=None, client_secret=None, 
-            access_token=None, use_https=True, session=None):
+            access_token=None, use_https=True, session=None, ratelimit=False, 
+            retry=None, coalesce=False, cache=None, conditional=False,
+            json_loads=None, json_dumps=None, model=False, chunk_sizes=None,
+            metrics=None):
         """Async factory method. 
 
         :param instance: domain name of an instance, i.e. 'mastodon.social'
@@ -48,6 +104,16 @@ class MastodonAPI:
         :param access_token: (optional) 
         :param use_https: (optional) set False to use plain text http
         :param session: (optional) aiohttp.ClientSession instance
+        :param ratelimit: (optional) set True or pass atoot.RateLimiter instance to throttle requests before hitting the API rate limits
+        :param retry: (optional) set True or pass atoot.RetryPolicy instance to retry requests on transient failures
+        :param coalesce: (optional) set True to share one request between concurrent identical GET calls, waiters get the same result object
+        :param cache: (optional) set True or pass atoot.ResponseCache instance to cache responses of slowly changing endpoints
+        :param conditional: (optional) set True or pass atoot.ValidatorStore instance to revalidate GET requests with ETag / Last-Modified
+        :param json_loads: (optional) function to decode JSON bytes, default is orjson or ujson if installed, json module otherwise
+        :param json_dumps: (optional) function to encode JSON request bodies
+        :param model: (optional) set True to return typed entities (atoot.models.Status, Account, etc.) instead of dicts where the endpoint is known
+        :param chunk_sizes: (optional) dict of maximum number of ids per request for array endpoints, i.e. {"account_relationships": 40}, if the instance uses other limits
+        :param metrics: (optional) set True or pass atoot.Metrics instance to collect per-endpoint request metrics
         :return: MastodonAPI instance.
 
         Usage::
@@ -61,9 +127,38 @@ class MastodonAPI:
         self.client_id = client_id
         self.client_secret = client_secret
         self._access_token = access_token
+        if access_token:
+            self._auth_headers = {"Authorization": "Bearer " + access_token}
         self.base_url = "http%s://%s" % ("s" if use_https else "", self.instance)
+        if metrics:
+            self.metrics = metrics if isinstance(metrics, Metrics) \
+                    else Metrics()
         self.session = session if session else aiohttp.ClientSession(
-                headers={"user-agent": __useragent__})
+                headers={"user-agent": __useragent__}, trace_configs=
+                [self.metrics.trace_config()] if self.metrics else None)
+        if ratelimit:
+            self.ratelimiter = ratelimit if isinstance(ratelimit, RateLimiter) \
+                    else RateLimiter()
+        if retry:
+            self.retry_policy = retry if isinstance(retry, RetryPolicy) \
+                    else RetryPolicy()
+        self.coalesce = coalesce
+        # empty caches are falsy, check the type first
+        if isinstance(cache, ResponseCache):
+            self.cache = cache
+        elif cache:
+            self.cache = ResponseCache()
+        if isinstance(conditional, ValidatorStore):
+            self.validators = conditional
+        elif conditional:
+            self.validators = ValidatorStore()
+        if json_loads:
+            self.json_loads = json_loads
+        if json_dumps:
+            self.json_dumps = json_dumps
+        self.model = model
+        if chunk_sizes:
+            self.chunk_sizes = dict(self.chunk_sizes, **chunk_sizes)
         return self
 
     def __init__(self):
@@ -71,6 +166,7 @@ class MastodonAPI:
         self.client_id = None
         self.client_secret = None
         self._access_token = None
+        self._auth_headers = {}
         self.base_url = None
         self.session = None
 
@@ -79,13 +175,30 @@ class MastodonAPI:
         self.ratelimit_reset = None
         self.ratelimit_server_date = None
         self.ratelimit_lastcall = None
+        self.ratelimiter = None
+        self.retry_policy = None
+        self.coalesce = False
+        self.cache = None
+        self.validators = None
+        self.json_loads = codec.loads
+        self.json_dumps = codec.dumps
+        self.model = False
+        self._inflight = {}
+        self._pool = None
+        self.chunk_sizes = CHUNK_SIZES
+        self.metrics = None
 
     def get_access_token(self):
         return self._access_token
 
     async def close(self):
-        """Close all network connections and shut down MastodonAPI"""
-        await self.session.close()
+        """Close all network connections and shut down MastodonAPI.
+        Clients of a ClientPool are released, the shared session stays open"""
+        if self._pool is not None:
+            self._pool.release(self)
+            self._pool = None
+        else:
+            await self.session.close()
 
     def _set_ratelimit_params(self, r):
         if "X-RateLimit-Limit" in r.headers: 
@@ -100,50 +213,163 @@ class MastodonAPI:
         self.ratelimit_lastcall = time.time()
 
     async def __api_request(self, method, url, use_json=False, 
-            headers={}, params=None, files=None):
+            headers=None, params=None, files=None, retry=None, template=None):
         content = None
+        path = url
         url = self.base_url + url
+        method_name = method.__name__.upper()
 
-        if self._access_token:
-            headers["Authorization"] = "Bearer " + self._access_token
+        # Headers are copied before adding anything to them, the shared
+        # auth headers dict is used as is for requests without extra headers
+        if headers:
+            headers = dict(self._auth_headers, **headers)
+        else:
+            headers = self._auth_headers
 
         kwargs = dict(headers=headers)
         if use_json == True:
-            kwargs["json"] = params
+            kwargs["headers"] = headers = dict(headers)
+            headers["Content-Type"] = "application/json"
+            kwargs["data"] = self.json_dumps(params)
+        elif files is not None:
+            # streamed multipart body, generated again for every attempt
+            kwargs["headers"] = headers = dict(headers, **files.headers)
         else:
             if method == self.session.get:
                 kwargs["params"] = params
             else:
                 kwargs["data"] = params
 
-        try:
-            r = await method(url, **kwargs)
-        except Exception as e:
-            raise NetworkError("Could not complete request: %s" % e)
-
-        async with r:
-            self._set_ratelimit_params(r)
-            await check_exception(r)
+        policy = self.retry_policy if retry is None else retry
+        if policy:
+            policy = policy.for_request(method_name, path)
+        if policy and type(params) == dict and \
+                any(hasattr(v, "read") for v in params.values()):
+            # file objects can't be rewound reliably, don't resend them
+            policy = None
+        if policy and files is not None and not files.replayable:
+            policy = None
+        idempotent = "Idempotency-Key" in headers
+
+        validator = None
+        if self.validators is not None and method_name == "GET":
+            validator_key = (url, repr(params), self._access_token)
+            validator = self.validators.get(validator_key)
+            if validator is not None:
+                kwargs["headers"] = headers = dict(headers)
+                if validator[0]:
+                    headers["If-None-Match"] = validator[0]
+                if validator[1]:
+                    headers["If-Modified-Since"] = validator[1]
+
+        attempt = 0
+        sample = None
+
+        while True:
+            attempt += 1
+            delay = None
+
+            if self.ratelimiter:
+                await self.ratelimiter.acquire(method_name, path)
+
+            if files is not None:
+                kwargs["data"] = files.body()
+
+            if self.metrics is not None:
+                sample = self.metrics.start(method_name, path)
+                kwargs["trace_request_ctx"] = sample
 
             try:
-                content = await r.json()
+                r = await method(url, **kwargs)
             except Exception as e:
-                raise ApiError("Can't parse JSON reply: %s" % e)
-
-            if type(content) == list:
-                content = ResponseList(content, method=method, 
-                                       params=params, headers=headers)
-                if "next" in r.links and "url" in r.links["next"]:
-                    content.next = r.links["next"]["url"].path_qs
-                if "previous" in r.links and "url" in r.links["previous"]:
-                    content.previous = r.links["previous"]["url"].path_qs
-
-        return content
+                if sample is not None:
+                    self.metrics.finish(sample, e)
+                if policy and policy.can_retry(attempt, method_name, 
+                                               idempotent=idempotent):
+                    await asyncio.sleep(policy.delay(attempt))
+                    continue
+                raise NetworkError("Could not complete request: %s" % e)
+
+            async with r:
+                try:
+                    self._set_ratelimit_params(r)
+                    if self.ratelimiter:
+                        self.ratelimiter.update(method_name, path, r.headers)
+                    if sample is not None:
+                        sample.status = r.status
+                        remaining = r.headers.get("X-RateLimit-Remaining")
+                        if remaining and remaining.isdigit():
+                            sample.ratelimit_remaining = int(remaining)
+
+                    if r.status == 304 and validator is not None:
+                        self.validators.revalidated += 1
+                        return validator[2]
+
+                    if policy and policy.can_retry(attempt, method_name, 
+                                                   r.status, idempotent):
+                        delay = policy.delay(attempt, r.status, r.headers)
+                    if delay is None:
+                        await check_exception(r)
+
+                        try:
+                            body = await r.read()
+                            if sample is not None:
+                                sample.bytes = len(body)
+                                decode_start = time.perf_counter()
+                            if body and not body.isspace():
+                                content = self.json_loads(body)
+                            if sample is not None:
+                                sample.decode = time.perf_counter() - \
+                                        decode_start
+                        except Exception as e:
+                            raise ApiError("Can't parse JSON reply: %s" % e)
+
+                        if type(content) == list:
+                            next_page = previous_page = None
+                            links = r.links
+                            if "next" in links and "url" in links["next"]:
+                                next_page = links["next"]["url"].path_qs
+                            if "previous" in links and "url" in links["previous"]:
+                                previous_page = links["previous"]["url"].path_qs
+                            if template is None and \
+                                    headers is self._auth_headers:
+                                template = RequestTemplate(method_name, ())
+                            elif template is None:
+                                template = RequestTemplate(method_name, tuple(
+                                    (k, v) for k, v in headers.items() 
+                                    if k not in _TRANSIENT_HEADERS))
+                            content = ResponseList(content, PageCursor(
+                                    next_page, previous_page, template))
+
+                        if self.model:
+                            model = model_for(path)
+                            if model is not None:
+                                content = to_models(content, model)
+
+                        if self.validators is not None and method_name == "GET" \
+                                and r.status == 200 and ("ETag" in r.headers or 
+                                        "Last-Modified" in r.headers):
+                            self.validators.set(validator_key, 
+                                                r.headers.get("ETag"), 
+                                                r.headers.get("Last-Modified"), 
+                                                content)
+
+                        return content
+                finally:
+                    if sample is not None:
+                        self.metrics.finish(sample)
+
+            await asyncio.sleep(delay)
+
+    async def _get_page(self, path, template):
+        return await self.__api_request(
+                getattr(self.session, template.method.lower()), path, 
+                headers=template.request_headers(), template=template)
 
     async def get_next(self, response):
         """Get next page of paginated results
 
-        :param response: ResponseList
+        :param response: ResponseList or PageCursor
 
         Usage::
 
@@ -151,20 +377,121 @@ class MastodonAPI:
         >>> if page1.next:
         >>>     page2 = await client.get_next(page1)
         """
-        if not response.next:
+        cursor = getattr(response, "cursor", response)
+        if not cursor or not cursor.next:
             raise ValueError("No next page")
-        return await self.__api_request(response.method, response.next,
-                                        **response.kwargs)
+        return await self._get_page(cursor.next, cursor.template)
 
     async def get_previous(self, response):
         """Get previous page of paginated results (see MastodonAPI.get_next)
 
-        :param response: ResponseList
+        :param response: ResponseList or PageCursor
         """
-        if not response.previous:
+        cursor = getattr(response, "cursor", response)
+        if not cursor or not cursor.previous:
             raise ValueError("No previous page")
-        return await self.__api_request(response.method, response.previous,
-                                        **response.kwargs)
+        return await self._get_page(cursor.previous, cursor.template)
+
+    async def _iter_pages(self, task, max_pages=None, prefetch=0):
+        """Yield pages of a paginated task, optionally fetching up to 
+        `prefetch` pages ahead in a background task."""
+        if prefetch <= 0:
+            resp = await task
+            n_pages = 1
+            while True:
+                yield resp
+                if not resp.next or (max_pages is not None and
+                        n_pages >= max_pages):
+                    return
+                resp = await self.get_next(resp)
+                n_pages += 1
+
+        queue = asyncio.Queue(maxsize=prefetch)
+
+        async def fetch():
+            try:
+                resp = await task
+                n_pages = 1
+                while True:
+                    await queue.put(resp)
+                    if not resp.next or (max_pages is not None and
+                            n_pages >= max_pages):
+                        break
+                    resp = await self.get_next(resp)
+                    n_pages += 1
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        fetcher = asyncio.ensure_future(fetch())
+        try:
+            while True:
+                resp = await queue.get()
+                if resp is None:
+                    return
+                if isinstance(resp, Exception):
+                    raise resp
+                yield resp
+        finally:
+            fetcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await fetcher
+
+    async def paginate(self, task, max_items=None, max_pages=None, 
+            until_id=None, pages=False, prefetch=0):
+        """Asynchronous iterator over the results of a paginated task.
+
+        Pages are requested one by one, as the iterator is consumed, so only 
+        the current page is kept in memory. With `prefetch` set, next pages 
+        are requested in the background while the current one is processed.
+
+        :param task: a coroutine which returns a paginated list of objects, or a PageCursor to resume from
+        :param max_items: (optional) stop after yielding this many items
+        :param max_pages: (optional) stop after fetching this many pages
+        :param until_id: (optional) stop when an item with this id is reached, the item itself is not yielded
+        :param pages: (optional) set True to yield whole pages instead of items
+        :param prefetch: (optional) number of pages to fetch ahead of the consumer, default is 0
+
+        Usage::
+
+        >>> async for acct in client.paginate(client.account_followers(acct)):
+        >>>     print(acct["acct"])
+
+        When breaking out of the loop early with `prefetch` enabled, wrap the 
+        iterator in `contextlib.aclosing` to cancel background requests right 
+        away.
+        """
+        if isinstance(task, PageCursor):
+            task = self.get_next(task)
+        n_items = 0
+        page_iter = self._iter_pages(task, max_pages=max_pages, 
+                                     prefetch=prefetch)
+        try:
+            async for resp in page_iter:
+                done = False
+                if until_id is not None or max_items is not None:
+                    for i, item in enumerate(resp):
+                        if until_id is not None and get_id(item) == until_id:
+                            done = True
+                            resp = resp[:i]
+                            break
+                    if max_items is not None and n_items + len(resp) >= max_items:
+                        done = True
+                        resp = resp[:max_items - n_items]
+
+                n_items += len(resp)
+                if pages:
+                    if len(resp) > 0:
+                        yield resp
+                else:
+                    for item in resp:
+                        yield item
+
+                if done:
+                    return
+        finally:
+            await page_iter.aclose()
 
     async def get_n_pages(self, task, n=1):
         """A shortcut function to get up to N number of pages from a paginated task.
@@ -176,16 +503,8 @@ class MastodonAPI:
 
         >>> statuses = await client.get_n_pages(client.public_timeline(), n=5)
         """
-        resp = await task
-        results = resp.copy()
-        p = 1
-
-        while resp.next and p < n:
-            resp = await self.get_next(resp)
-            results.extend(resp)
-            p += 1
-
-        return results
+        return ResponseList([item async for item in 
+                             self.paginate(task, max_pages=n)])
 
     async def get_all(self, task):
         """A shortcut function to get all results from a paginated task.
@@ -196,29 +515,72 @@ class MastodonAPI:
 
         >>> notifs = await client.get_all(client.get_notifications())
         """
-        resp = await task
-        results = resp.copy()
-
-        while resp.next:
-            resp = await self.get_next(resp)
-            results.extend(resp)
-
-        return results
+        return ResponseList([item async for item in self.paginate(task)])
+
+    def _request_key(self, url, kwargs):
+        items = []
+        for k, v in sorted(kwargs.items()):
+            if type(v) == dict:
+                v = sorted(v.items())
+            items.append((k, v))
+        return (url, repr(items), self._access_token)
+
+    def _inflight_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # mark exception as retrieved if every waiter is gone
+            task.exception()
 
     async def get(self, url, **kwargs):
-        return await self.__api_request(self.session.get, url, **kwargs)
+        ttl = self.cache.ttl_for(url) if self.cache is not None else None
+        if not ttl and not self.coalesce:
+            return await self.__api_request(self.session.get, url, **kwargs)
+
+        key = self._request_key(url, kwargs)
+        if ttl:
+            content = self.cache.get(key, _MISSING)
+            if content is not _MISSING:
+                return content
+
+        if self.coalesce:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(
+                        self._fetch(url, key, ttl, kwargs))
+                self._inflight[key] = task
+                task.add_done_callback(
+                        functools.partial(self._inflight_done, key))
+            return await asyncio.shield(task)
+        return await self._fetch(url, key, ttl, kwargs)
+
+    async def _fetch(self, url, key, ttl, kwargs):
+        if ttl:
+            generation = self.cache.generation(url)
+        content = await self.__api_request(self.session.get, url, **kwargs)
+        # a write request finished meanwhile, the response may be stale
+        if ttl and self.cache.generation(url) == generation:
+            self.cache.set(key, url, content, ttl)
+        return content
+
+    async def _write(self, method, url, kwargs):
+        try:
+            return await self.__api_request(method, url, **kwargs)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(url)
 
     async def post(self, url, **kwargs):
-        return await self.__api_request(self.session.post, url, **kwargs)
+        return await self._write(self.session.post, url, kwargs)
 
     async def put(self, url, **kwargs):
-        return await self.__api_request(self.session.put, url, **kwargs)
+        return await self._write(self.session.put, url, kwargs)
 
     async def patch(self, url, **kwargs):
-        return await self.__api_request(self.session.patch, url, **kwargs)
+        return await self._write(self.session.patch, url, kwargs)
 
     async def delete(self, url, **kwargs):
-        return await self.__api_request(self.session.delete, url, **kwargs)
+        return await self._write(self.session.delete, url, kwargs)
 
     async def _account_info(self, account, info="", **kwargs):
         return await self.get(
@@ -236,6 +598,57 @@ class MastodonAPI:
         return await self.post(
                 '/api/v1/statuses/%s/%s' % (get_id(status), action))
 
+    def bulk(self, method, items, concurrency=8, chunk_size=None, skip=None):
+        """Run a mass action with bounded concurrency, results and errors 
+        are yielded as the requests complete.
+
+        API errors don't stop the operation, they are returned in 
+        BulkResult.error. Requests go through this client, so its rate 
+        limiter and retry policy apply. Endpoints accepting arrays of ids
+        (account_relationships, list_accounts_add, list_accounts_remove) get
+        lists of up to the server maximum of items.
+
+        :param method: client method or its name, i.e. "account_follow", use functools.partial to bind other arguments
+        :param items: iterable of ids or entities
+        :param concurrency: (optional) maximum number of concurrent requests
+        :param chunk_size: (optional) number of items per request for array endpoints
+        :param skip: (optional) ids of items done in a previous run, to resume an interrupted operation
+        :return: asynchronous iterator of atoot.bulk.BulkResult objects
+
+        Usage::
+
+        >>> done = set()
+        >>> async for r in c.bulk("account_follow", account_ids, concurrency=4):
+        >>>     if r.ok:
+        >>>         done.add(r.item)
+        >>>     else:
+        >>>         print(r.item, r.error)
+        """
+        if isinstance(method, str):
+            method = getattr(self, method)
+        if chunk_size is None:
+            chunk_size = chunk_size_for(method, self.chunk_sizes)
+        return bulk(method, items, concurrency=concurrency, 
+                    chunk_size=chunk_size, skip=skip, key=get_id, 
+                    errors=MastodonError)
+
+    async def _chunked(self, name, method, items, concurrency=4):
+        """Send items of an array endpoint in chunks of the server maximum 
+        size, concurrently, return list results merged in input order"""
+        size = self.chunk_sizes.get(name)
+        if not size or len(items) <= size:
+            return await method(items)
+        results = [r async for r in bulk(method, items, concurrency=concurrency,
+                                         chunk_size=size, errors=())]
+        results.sort()
+        if not isinstance(results[0].result, (list, UserList)):
+            return results[-1].result
+        merged = ResponseList() if isinstance(results[0].result, ResponseList) \
+                else []
+        for r in results:
+            merged.extend(r.result)
+        return merged
+
     @staticmethod
     async def create_app(session, instance, use_https=True, scopes=SCOPES,
             client_name="atoot", client_website=None):
@@ -354,11 +767,12 @@ class MastodonAPI:
     ### Methods concerning user accounts and related information.
 
     async def register_account(self, username, email, password, agreement, 
-            locale, reason=None, params={}):
+            locale, reason=None, params=None):
         """Creates a user and account records. 
 
         :return: Returns an account access token for the app that initiated the request. The app should save this token for later, and should wait for the user to confirm their account by  clicking a link in their email inbox.
         """
+        params = dict(params) if params else {}
         if reason: params["reason"] = reason
         params["username"] = username
         params["email"] = email
@@ -376,7 +790,7 @@ class MastodonAPI:
 
     async def update_account_credentials(self, discoverable=None, bot=None, 
             display_name=None, note=None,  avatar=None, header=None, 
-            locked=None, fields_attributes=None, params={}):
+            locked=None, fields_attributes=None, params=None):
         """Update the user's display and preferences.
 
         :param discoverable: (optional) Whether the account should be shown in the profile directory.
@@ -388,6 +802,7 @@ class MastodonAPI:
         :param locked: (optional) Whether manual approval of follow requests is required.
         :param fields_attributes: (optional) Profile metadata name and value. (By default, max 4 fields and 255 characters per property/value)
         """
+        params = dict(params) if params else {}
         if discoverable is not None: 
             params["discoverable"] = str_bool(discoverable)
         if bot is not None: params["bot"] = str_bool(bot)
@@ -416,11 +831,13 @@ class MastodonAPI:
         """
         return await self._account_info(account, 'statuses')
 
-    async def account_followers(self, account, params={}, limit=None):
+    async def account_followers(self, account, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self._account_info(account, 'followers', params=params)
 
-    async def account_following(self, account, params={}, limit=None):
+    async def account_following(self, account, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self._account_info(account, 'following', params=params)
 
@@ -457,6 +874,16 @@ class MastodonAPI:
         return await self._account_action(account, "unpin")
 
     async def account_relationships(self, ids):
+        """Relationships with the given accounts. Long lists are split into
+        requests of the server maximum size, sent concurrently.
+
+        :param ids: list of Account objects or id strings
+        :return: list of Relationship objects in the order of ids
+        """
+        return await self._chunked("account_relationships", 
+                self._account_relationships, [get_id(i) for i in ids])
+
+    async def _account_relationships(self, ids):
         return await self.get('/api/v1/accounts/relationships', 
                               params=[("id", i,) for i in ids])
 
@@ -473,23 +900,28 @@ class MastodonAPI:
         return await self.get('/api/v1/accounts/search', params={'q': query})
 
     ### Accounts/misc
-    async def bookmarks(self, params={}, limit=None):
+    async def bookmarks(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/bookmarks', params=params)
 
-    async def favourites(self, params={}, limit=None):
+    async def favourites(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/favourites', params=params)
 
-    async def mutes(self, params={}, limit=None):
+    async def mutes(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/mutes', params=params)
 
-    async def blocks(self, params={}, limit=None):
+    async def blocks(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/blocks', params=params)
 
-    async def domain_blocks(self, params={}, limit=None):
+    async def domain_blocks(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/domain_blocks', params=params)
 
@@ -499,12 +931,14 @@ class MastodonAPI:
     async def view_filter(self, _filter):
         return await self.get('/api/v1/filters/%s' % get_id(_filter))
 
-    async def create_filter(self, phrase, context, params={}):
+    async def create_filter(self, phrase, context, params=None):
+        params = dict(params) if params else {}
         params["phrase"] = phrase
         params["context"] = context
         return await self.post('/api/v1/filters', params=params)
 
-    async def update_filter(self, _filter, phrase=None, context=None, params={}):
+    async def update_filter(self, _filter, phrase=None, context=None, params=None):
+        params = dict(params) if params else {}
         if phrase: params["phrase"] = phrase
         if context: params["context"] = context
         return await self.put('/api/v1/filters/%s' % get_id(_filter),
@@ -513,11 +947,13 @@ class MastodonAPI:
     async def remove_filter(self, _filter):
         return await self.delete('/api/v1/filters/%s' % get_id(_filter))
 
-    async def create_report(self, account, params={}):
+    async def create_report(self, account, params=None):
+        params = dict(params) if params else {}
         params["account_id"] = get_id(account)
         return await self.post('/api/v1/reports', params=params)
 
-    async def follow_requests(self, params={}, limit=None):
+    async def follow_requests(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/follow_requests', params=params)
 
@@ -529,7 +965,8 @@ class MastodonAPI:
         return await self.post(
                 '/api/v1/follow_requests/{}/reject' % get_id(account))
 
-    async def endorsements(self, params={}, limit=None):
+    async def endorsements(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/endorsements', params=params)
 
@@ -557,8 +994,8 @@ class MastodonAPI:
     ### Statuses
 
     async def create_status(
-        self, params={}, status=None, media_ids=None,
-        poll_options=[], poll_expires_in=None, 
+        self, params=None, status=None, media_ids=None,
+        poll_options=None, poll_expires_in=None, 
         poll_multiple=None, poll_hide_totals=None,
         in_reply_to_id=None, sensitive=False, spoiler_text=None,
         visibility='public', scheduled_at=None, language=None,
@@ -583,6 +1020,7 @@ class MastodonAPI:
         :type sensitive: bool
         :return: Status object. When scheduled_at is present, ScheduledStatus is returned instead.
         """
+        params = dict(params) if params else {}
 
         # Idempotency key assures the same status is not posted multiple times
         # if the request is retried.
@@ -665,28 +1103,125 @@ class MastodonAPI:
         return await self._status_action(status, "unpin")
 
     ### Statuses/Misc
-    async def upload_attachment(self, fileobj, params={}, description=None, 
-                           focal=None):
+    async def upload_attachment(self, fileobj, params=None, description=None, 
+                           focal=None, filename=None, size=None, progress=None):
         """Creates an attachment to be used with a new status.
 
-        :param fileobj: file object, i.e. fileobj=open('image.jpg', 'rb')
+        The file is streamed from its source, without reading it into 
+        memory. Files are read in a thread, so the event loop isn't blocked.
+
+        :param fileobj: file path, bytes or memoryview, binary file object, i.e. fileobj=open('image.jpg', 'rb'), or asynchronous iterator of bytes
         :param description: A plain-text description of the media, for accessibility purposes.
         :param focal: Two floating points (x,y), comma-delimited, ranging from -1.0 to 1.0
+        :param filename: (optional) file name sent to the server, its extension determines the MIME type
+        :param size: (optional) size of an asynchronous iterator in bytes, to send it with Content-Length
+        :param progress: (optional) function called with (bytes sent, total bytes) during the upload
         """
-        params["file"] = fileobj
+        params = dict(params) if params else {}
         if description: params["description"] = description
         if focal: params["focal"] = focal
-        return await self.post('/api/v1/media', params=params)
+        return await self.post('/api/v1/media', files=Upload(fileobj, params, 
+                filename=filename, size=size, progress=progress))
 
-    async def update_attachment(self, attachment, fileobj=None, params={}, 
-            description=None, focal=None):
+    async def update_attachment(self, attachment, fileobj=None, params=None, 
+            description=None, focal=None, filename=None, size=None, 
+            progress=None):
         """Update an Attachment, before it is attached to a status and posted.
+
+        Arguments are the same as for :meth:`upload_attachment`.
         """
-        if fileobj: params["file"] = fileobj
+        params = dict(params) if params else {}
         if description: params["description"] = description
         if focal: params["focal"] = focal
-        return await self.put('/api/v1/media/%s' % get_id(attachment), 
-                              params=params)
+        url = '/api/v1/media/%s' % get_id(attachment)
+        if fileobj:
+            return await self.put(url, files=Upload(fileobj, params, 
+                    filename=filename, size=size, progress=progress))
+        return await self.put(url, params=params)
+
+    async def upload_media(self, fileobj, params=None, description=None, 
+            focal=None, filename=None, size=None, progress=None, wait=False,
+            timeout=300):
+        """Upload media with the asynchronous /api/v2/media endpoint.
+
+        Large files are processed by the server after the upload, the 
+        returned attachment has no `url` until processing is finished.
+
+        Arguments are the same as for :meth:`upload_attachment`.
+
+        :param wait: (optional) set True to wait until the attachment is processed
+        :param timeout: (optional) seconds to wait for processing
+        :return: MediaAttachment object
+        """
+        params = dict(params) if params else {}
+        if description: params["description"] = description
+        if focal: params["focal"] = focal
+        attachment = await self.post('/api/v2/media', files=Upload(fileobj, 
+                params, filename=filename, size=size, progress=progress))
+        if wait:
+            attachment = await self.wait_for_media(attachment, timeout)
+        return attachment
+
+    async def view_attachment(self, attachment):
+        return await self.get('/api/v1/media/%s' % get_id(attachment))
+
+    async def wait_for_media(self, attachment, timeout=300, interval=0.5, 
+            max_interval=5.0):
+        """Wait until the server has processed an uploaded attachment.
+
+        The attachment is polled with a delay growing from `interval` to 
+        `max_interval` seconds, short files are ready after the first 
+        checks while long videos don't cost a request every half a second.
+
+        :param attachment: MediaAttachment object or id string
+        :param timeout: (optional) seconds to wait, asyncio.TimeoutError is raised after
+        :return: processed MediaAttachment object
+        """
+        async def poll(attachment, delay):
+            while type(attachment) == str or not attachment.get("url"):
+                await asyncio.sleep(delay)
+                delay = min(delay * 1.5, max_interval)
+                attachment = await self.view_attachment(attachment)
+            return attachment
+
+        if type(attachment) != str and attachment.get("url"):
+            return attachment
+        return await asyncio.wait_for(poll(attachment, interval), timeout)
+
+    async def create_status_with_media(self, files, concurrency=4, 
+            timeout=300, **kwargs):
+        """Upload files in parallel, wait until all of them are processed 
+        and post a status with them, in the order of files.
+
+        :param files: list of files as accepted by :meth:`upload_attachment`, or (file, description) tuples
+        :param concurrency: (optional) maximum number of parallel uploads
+        :param timeout: (optional) seconds to wait for processing of each file
+        :param kwargs: arguments for :meth:`create_status`
+        :return: Status object
+
+        Usage::
+
+        >>> await c.create_status_with_media(
+        >>>     [("cat.jpg", "A cat"), ("dog.mp4", "A dog")], status="Pets")
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload(item):
+            fileobj, description = item if type(item) == tuple \
+                    else (item, None)
+            async with semaphore:
+                attachment = await self.upload_media(fileobj, 
+                                                     description=description)
+            return await self.wait_for_media(attachment, timeout)
+
+        tasks = [asyncio.ensure_future(upload(item)) for item in files]
+        try:
+            attachments = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return await self.create_status(
+                media_ids=[get_id(a) for a in attachments], **kwargs)
 
     async def view_poll(self, poll):
         return await self.get('/api/v1/polls/%s' % get_id(poll))
@@ -695,7 +1230,8 @@ class MastodonAPI:
         return await self.post('/api/v1/polls/%s/votes' % get_id(poll), 
                 params={"choices": choices})
 
-    async def scheduled_statuses(self, params={}, limit=None):
+    async def scheduled_statuses(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/scheduled_statuses', params=params)
 
@@ -710,7 +1246,7 @@ class MastodonAPI:
         return await self.delete('/api/v1/scheduled_statuses/{}' % get_id(status))
 
     ### Timelines
-    async def public_timeline(self, params={}, limit=None, 
+    async def public_timeline(self, params=None, limit=None, 
             local=None, only_media=None):
         """View statuses from the public timeline
 
@@ -719,12 +1255,13 @@ class MastodonAPI:
         :param only_media: If true, return only statuses with media attachments. Defaults to false.
         :returns: List of Statuses
         """
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         if local is not None: params["local"] = str_bool(local)
         if only_media is not None: params["only_media"] = str_bool(only_media)
         return await self.get('/api/v1/timelines/public', params=params)
 
-    async def hashtag_timeline(self, hashtag, params={}, limit=None, 
+    async def hashtag_timeline(self, hashtag, params=None, limit=None, 
             local=None, only_media=None):
         """View public statuses containing the given hashtag.
 
@@ -734,24 +1271,26 @@ class MastodonAPI:
         :param only_media: If true, return only statuses with media attachments. Defaults to false.
         :returns: List of Statuses
         """
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         if local is not None: params["local"] = str_bool(local)
         if only_media is not None: params["only_media"] = str_bool(only_media)
         return await self.get('/api/v1/timelines/tag/%s' % hashtag, 
                 params=params)
 
-    async def home_timeline(self, params={}, limit=None, local=None):
+    async def home_timeline(self, params=None, limit=None, local=None):
         """View statuses from followed users.
 
         :param limit: Maximum number of results to return. Defaults to 20.
         :param local: If true, return only local statuses. Defaults to false.
         :returns: List of Statuses
         """
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         if local is not None: params["local"] = str_bool(local)
         return await self.get('/api/v1/timelines/home', params=params)
 
-    async def list_timeline(self, _list, params={}, limit=None):
+    async def list_timeline(self, _list, params=None, limit=None):
         """View statuses in the given list timeline.
 
         :param _list: Local ID of the list in the database.
@@ -759,13 +1298,15 @@ class MastodonAPI:
         :param local: If true, return only local statuses. Defaults to false.
         :returns: List of Statuses
         """
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/timelines/list/%s' % get_id(_list), 
                 params=params)
 
     ### Timelines/Misc
 
-    async def conversations(self, params={}, limit=None):
+    async def conversations(self, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/conversations', params=params)
 
@@ -793,56 +1334,185 @@ class MastodonAPI:
     async def delete_list(self, _list):
         return await self.delete('/api/v1/lists/%s' % get_id(_list)) 
 
-    async def list_accounts(self, _list, params={}, limit=None):
+    async def list_accounts(self, _list, params=None, limit=None):
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         return await self.get('/api/v1/lists/%s/accounts' % get_id(_list),
                 params=params) 
 
     async def list_accounts_add(self, _list, accounts):
         account_ids = [get_id(a) for a in accounts]
-        return await self.post('/api/v1/lists/%s/accounts' % get_id(_list), 
-                params={"account_ids": account_ids}, use_json=True)
+        return await self._chunked("list_accounts_add", functools.partial(
+                self._list_accounts, self.post, _list), account_ids)
 
     async def list_accounts_remove(self, _list, accounts):
         account_ids = [get_id(a) for a in accounts]
-        return await self.delete('/api/v1/lists/%s/accounts' % get_id(_list), 
+        return await self._chunked("list_accounts_remove", functools.partial(
+                self._list_accounts, self.delete, _list), account_ids)
+
+    async def _list_accounts(self, method, _list, account_ids):
+        return await method('/api/v1/lists/%s/accounts' % get_id(_list), 
                 params={"account_ids": account_ids}, use_json=True)
 
     async def markers_get(self):
         return await self.get('/api/v1/markers')
 
-    async def markers_set(self, params={}):
+    async def markers_set(self, params=None):
+        params = dict(params) if params else {}
         return await self.post('/api/v1/markers', params=params, use_json=True)
 
 
-    def streaming(self, stream, list_filter=None, tag_filter=None):
-        """Asynchronous context manager for using websocket streaming API
+    def streaming(self, stream, list_filter=None, tag_filter=None, 
+            events=None, transport="auto", heartbeat=None):
+        """Asynchronous context manager for using streaming API
 
         :params stream: one of the following: user, public, public:local, hashtag, hashtag:local, list, direct
-        :return: aiohttp.ClientWebSocketResponse object
+        :param events: (optional) event types to deliver, i.e. ["update"], other events are skipped before decoding
+        :param transport: (optional) "websocket", "sse" (Server-Sent Events) or "auto", which falls back to SSE when websocket handshake fails
+        :param heartbeat: (optional) seconds between websocket pings, or SSE read timeout, the connection is closed when the server stops answering
+        :return: atoot.streaming.EventStream, an asynchronous iterator of StreamEvent objects
 
         Usage::
 
-            async with client.streaming("user") as ws:
-                async for msg in ws:
-                    print(msg.json())
+            async with client.streaming("user") as stream:
+                async for event in stream:
+                    print(event.event, event.payload)
 
         """
         ws_url =  "{}/api/v1/streaming/?stream={}&access_token={}".format(
                 self.base_url, stream, self._access_token)
         if list_filter: ws_url += "&list=%s" % list_filter
         if tag_filter: ws_url += "&tag=%s" % tag_filter
-        return self.session.ws_connect(ws_url)
 
-    async def streaming_handler(self, stream, handler, **kwargs):
+        params = {}
+        if list_filter: params["list"] = str(list_filter)
+        if tag_filter: params["tag"] = tag_filter
+        connect_sse = functools.partial(self.session.get, 
+                self.base_url + SSE_PATHS.get(stream, SSE_PATHS["user"]), 
+                params=params, headers=self._auth_headers, 
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=heartbeat))
+
+        return EventStream(functools.partial(self.session.ws_connect, ws_url,
+                                             heartbeat=heartbeat),
+                           loads=self.json_loads, events=events, 
+                           connect_sse=connect_sse, transport=transport)
+
+    def managed_stream(self, stream, list_filter=None, tag_filter=None, 
+            **kwargs):
+        """Streaming API events with automatic reconnects and backfill of 
+        the events missed while disconnected.
+
+        :params stream: one of the following: user, public, public:local, hashtag, hashtag:local, list, direct
+        :param events: (optional) event types to deliver
+        :param backfill: (optional) set False to skip fetching missed events from REST API
+        :param max_backfill_pages: (optional) maximum number of pages to fetch per timeline after a reconnect
+        :param backoff: (optional) initial reconnect delay in seconds
+        :param max_backoff: (optional) maximum reconnect delay in seconds
+        :param heartbeat: (optional) seconds between websocket pings, a connection which stops answering is reconnected
+        :return: atoot.streaming.ManagedStream, an asynchronous iterator of StreamEvent objects
+
+        Usage::
+
+            async for event in client.managed_stream("user"):
+                if event.event == "update":
+                    print(event.payload["content"])
+        """
+        return ManagedStream(self, stream, list_filter=list_filter, 
+                             tag_filter=tag_filter, **kwargs)
+
+    def stream_multiplexer(self, **kwargs):
+        """Subscribe to many streams over a single websocket connection.
+
+        :param queue_size: (optional) maximum number of queued events per subscription
+        :param backoff: (optional) initial reconnect delay in seconds
+        :param max_backoff: (optional) maximum reconnect delay in seconds
+        :param heartbeat: (optional) seconds between websocket pings, a connection which stops answering is reconnected
+        :return: atoot.streaming.StreamMultiplexer
+
+        Usage::
+
+            async with client.stream_multiplexer() as mux:
+                tags = [await mux.subscribe("hashtag", tag_filter=t) 
+                        for t in ("python", "asyncio")]
+                print(await tags[0].get())
+        """
+        return StreamMultiplexer(self, **kwargs)
+
+    async def streaming_handler(self, stream, handler, workers=None, 
+            queue_size=1000, overflow="block", key=None, **kwargs):
+        """Call `handler(client, event)` for every streaming API event.
+
+        By default events are handled one by one, in the websocket read 
+        loop. With `workers` set, events are put into a bounded queue and 
+        handled by concurrent worker coroutines, so slow handlers don't 
+        stall reading from the socket. Other keyword arguments are passed
+        to :meth:`MastodonAPI.streaming`.
+
+        :params stream: one of the following: user, public, public:local, hashtag, hashtag:local, list, direct
+        :param handler: coroutine function
+        :param workers: (optional) number of concurrent handlers
+        :param queue_size: (optional) maximum number of queued events
+        :param overflow: (optional) policy for a full queue: "block", "drop-oldest" or "coalesce"
+        :param key: (optional) function returning a key of an event, events with the same key are handled in order by the same worker (and coalesced with the "coalesce" policy)
+
+        Usage::
+
+            async def handler(client, event):
+                print(event.payload)
+
+            await client.streaming_handler("user", handler, workers=8, 
+                                           events=["update"])
+        """
+        with suppress(asyncio.CancelledError):
+            async with self.streaming(stream, **kwargs) as events:
+                if not workers:
+                    async for event in events:
+                        await handler(self, event)
+                else:
+                    await run_workers(events, functools.partial(handler, self), 
+                                      workers, queue_size=queue_size, 
+                                      overflow=overflow, key=key)
+
+    async def streaming_batch_handler(self, stream, handler, max_batch=100, 
+            max_latency=0.2, **kwargs):
+        """Call `handler(client, events)` with lists of streaming API events.
+
+        A batch is delivered when it has `max_batch` events or when its first
+        event has waited `max_latency` seconds. When the task is cancelled, 
+        the remaining events are delivered in a final call to the handler.
+        Other keyword arguments are passed to :meth:`MastodonAPI.streaming`.
+
+        :params stream: one of the following: user, public, public:local, hashtag, hashtag:local, list, direct
+        :param handler: coroutine function
+        :param max_batch: (optional) maximum number of events in a batch
+        :param max_latency: (optional) maximum delay of an event in seconds
+
+        Usage::
+
+            async def handler(client, events):
+                await db.insert_many([e.payload for e in events])
+
+            await client.streaming_batch_handler("public", handler, 
+                    max_batch=500, max_latency=0.5, events=["update"])
+        """
         with suppress(asyncio.CancelledError):
-            async with self.streaming(stream, **kwargs) as ws:
-                async for msg in ws:
-                    await handler(self, msg)
+            async with self.streaming(stream, **kwargs) as events:
+                batcher = Batcher(events, max_batch, max_latency)
+                batches = batcher.batches()
+                try:
+                    async for batch in batches:
+                        await handler(self, batch)
+                finally:
+                    # an event read ahead is added to the batch when the
+                    # generator is closed, close it before taking the rest
+                    await batches.aclose()
+                    rest = batcher.take()
+                    if rest:
+                        await handler(self, rest)
 
     ### Notifications
 
-    async def get_notifications(self, params={}, limit=None, exclude_types=None,
+    async def get_notifications(self, params=None, limit=None, exclude_types=None,
                                 account=None):
         """Receive notifications for activity on your account or statuses.
 
@@ -851,6 +1521,7 @@ class MastodonAPI:
         :param account: Return only notifications received from this account
         :return: List of notifications
         """
+        params = dict(params) if params else {}
         if limit: params["limit"] = limit
         if exclude_types: params["exclude_types"] = exclude_types
         if account: params["account_id"] = get_id(account)
@@ -875,9 +1546,10 @@ class MastodonAPI:
 
     ### Search
 
-    async def search(self, query, params={}, limit=None, account=None,
+    async def search(self, query, params=None, limit=None, account=None,
             search_type=None, exclude_unreviewed=None, resolve=None, 
             following=None):
+        params = dict(params) if params else {}
         params["q"] = query
         if limit: params["limit"] = limit
         if account: params["account_id"] = get_id(account)
@@ -904,8 +1576,9 @@ class MastodonAPI:
     async def trending_tags(self, limit=None):
         return await self.get('/api/v1/trends', params={"limit": limit})
 
-    async def profile_directory(self, params={}, offset=None, limit=None,
+    async def profile_directory(self, params=None, offset=None, limit=None,
             order=None, local=None):
+        params = dict(params) if params else {}
         if offset: params["offset"] = offset
         if limit: params["limit"] = limit
         if order: params["order"] = order
@@ -920,7 +1593,8 @@ class MastodonAPI:
     async def admin_accounts(self, local=None, remote=None, 
                 by_domain=None, active=None, pending=None, disabled=None, 
                 silenced=None, suspended=None, username=None, display_name=None, 
-                email=None, ip=None, staff=None, params={}):
+                email=None, ip=None, staff=None, params=None):
+        params = dict(params) if params else {}
         if local is not None: params["local"] = str_bool(local)
         if remote is not None: params["remote"] = str_bool(remote)
         if by_domain: params["by_domain"] = by_domain
@@ -940,7 +1614,8 @@ class MastodonAPI:
         return self.get("/api/v1/admin/accounts/%s" % get_id(account))
 
     async def admin_account_action(self, account, action=None, report=None, 
-            warning=None, text=None, notification=None, params={}):
+            warning=None, text=None, notification=None, params=None):
+        params = dict(params) if params else {}
         if action: params["action"] = action
         if report: params["report_id"] = get_id(report)
         if warning: params["warning_preset_id"] = warning
@@ -967,7 +1642,8 @@ class MastodonAPI:
 
 
     async def admin_reports(self, resolved=None, account=None, 
-            target_account=None, params={}):
+            target_account=None, params=None):
+        params = dict(params) if params else {}
         if resolved is not None: params["resolved"] = str_bool(resolved)
         if account: params["account_id"] = get_id(account)
         if target_account: params["target_account_id"] = get_id(target_account)
@@ -991,14 +1667,16 @@ class MastodonAPI:
 
     ### Proofs
 
-    async def get_proofs(self, params={}, provider=None, username=None):
+    async def get_proofs(self, params=None, provider=None, username=None):
+        params = dict(params) if params else {}
         if provider: params["provider"] = provider
         if username: params["username"] = username
         return await self.get('/api/proofs', params=params)
 
     ### OEmbed
 
-    async def oembed(self, url, params={}, maxwidth=None, maxheight=None):
+    async def oembed(self, url, params=None, maxwidth=None, maxheight=None):
+        params = dict(params) if params else {}
         params["url"] = url
         if maxwidth: params["maxwidth"] = maxwidth
         if maxheight: params["maxheight"] = maxheight
@@ -0,0 +1,93 @@
+import asyncio
+
+from collections import namedtuple
+from itertools import islice
+
+# Maximum number of ids per request for endpoints accepting arrays
+CHUNK_SIZES = {
+    "account_relationships": 40,
+    "list_accounts_add": 40,
+    "list_accounts_remove": 40,
+}
+
+
+class BulkResult(namedtuple("BulkResult", ("index", "item", "result", "error"))):
+    """Outcome of one call made by :func:`bulk`.
+
+    `index` is the position of the item in the input, for chunked endpoints
+    `item` is the list of items sent together and `index` is the position
+    of the first one. Either `result` or `error` is set.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def chunk_size_for(method, chunk_sizes=CHUNK_SIZES):
+    """Server maximum of ids per request for the method, None if it takes
+    one item"""
+    func = getattr(method, "func", method)  # functools.partial
+    return chunk_sizes.get(getattr(func, "__name__", None))
+
+
+def _chunks(indexed, size):
+    indexed = iter(indexed)
+    while True:
+        chunk = list(islice(indexed, size))
+        if not chunk:
+            return
+        yield chunk[0][0], [item for _, item in chunk]
+
+
+async def bulk(method, items, concurrency=8, chunk_size=None, skip=None,
+        key=None, errors=(Exception,)):
+    """Call `method` for every item with at most `concurrency` calls in
+    flight, yield BulkResult objects as the calls complete.
+
+    :param method: coroutine function taking one item
+    :param items: iterable of items
+    :param concurrency: (optional) maximum number of concurrent calls
+    :param chunk_size: (optional) pass lists of this many items to method, the default is the server maximum for known array endpoints
+    :param skip: (optional) keys of items done in a previous run
+    :param key: (optional) function returning the key of an item for `skip`
+    :param errors: (optional) exception types returned in BulkResult.error, others are raised
+    """
+    if chunk_size is None:
+        chunk_size = chunk_size_for(method)
+    jobs = enumerate(items)
+    if skip:
+        skip = frozenset(skip)
+        key = key or (lambda item: item)
+        jobs = ((i, item) for i, item in jobs if key(item) not in skip)
+    if chunk_size:
+        jobs = _chunks(jobs, chunk_size)
+
+    async def call(index, item):
+        try:
+            return BulkResult(index, item, await method(item), None)
+        except errors as e:
+            return BulkResult(index, item, None, e)
+
+    # new calls are started only while the consumer is reading results
+    pending = set()
+    try:
+        for index, item in jobs:
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(call(index, item)))
+
+        while pending:
+            done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,186 @@
+import re
+import time
+
+from collections import OrderedDict
+
+# Cached endpoints and their time to live in seconds
+DEFAULT_TTLS = (
+    (r"/api/v1/instance/?$", 3600),
+    (r"/api/v1/instance/peers$", 3600),
+    (r"/api/v1/custom_emojis$", 3600),
+    (r"/api/v1/accounts/verify_credentials$", 300),
+    (r"/api/v1/accounts/(?!relationships|search)[^/]+/?$", 300),
+    (r"/api/v1/lists(/[^/]+)?/?$", 300),
+    (r"/api/v1/filters(/[^/]+)?/?$", 300),
+    (r"/api/v1/preferences$", 300),
+)
+
+# Write requests with side effects on other resources than the path
+# they are sent to and its parents
+DEFAULT_INVALIDATIONS = (
+    (r"/api/v1/accounts/update_credentials$",
+        ("/api/v1/accounts/verify_credentials", "/api/v1/preferences")),
+)
+
+
+class ResponseCache:
+    """In-memory LRU cache for responses of slowly changing endpoints.
+
+    Entries expire after a per-endpoint time to live and the least recently
+    used entries are evicted when the cache is full. Write requests (POST,
+    PUT, PATCH, DELETE) invalidate cached responses of the same resource,
+    its parents and its children, i.e. `update_list` invalidates `show_list`
+    and `lists`.
+
+    Cached objects are shared between callers, don't modify them in place.
+
+    :param maxsize: (optional) maximum number of cached responses
+    :param ttls: (optional) list of (path regex, seconds) tuples, only matching endpoints are cached
+    :param invalidations: (optional) list of (path regex, list of paths) tuples, extra paths to invalidate after a write request
+
+    Usage::
+
+    >>> c = await atoot.MastodonAPI.create(instance, access_token=token,
+    >>>                                    cache=atoot.ResponseCache(256))
+    >>> await c.get_instance()
+    >>> print(c.cache.hits, c.cache.misses)
+    """
+
+    def __init__(self, maxsize=1024, ttls=DEFAULT_TTLS,
+            invalidations=DEFAULT_INVALIDATIONS):
+        self.maxsize = maxsize
+        self.ttls = [(re.compile(p), ttl) for p, ttl in ttls]
+        self.invalidations = [(re.compile(p), paths)
+                              for p, paths in invalidations]
+        self._entries = OrderedDict()
+        # invalidation generations of paths and path prefixes
+        self._generations = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl_for(self, path):
+        """Time to live for the endpoint, None if it is not cached"""
+        path = path.split("?", 1)[0]
+        for pattern, ttl in self.ttls:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key, path, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl,
+                              path.split("?", 1)[0].rstrip("/"), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def generation(self, path):
+        """Value changing when cached responses of the path are invalidated,
+        compare it before and after a request to not cache a response a
+        write request made stale in the meantime"""
+        path = path.split("?", 1)[0].rstrip("/")
+        generations, floor = self._generations, self._floor
+        # writes to the path or below it, writes to its parents
+        generation = [generations.get(path + "/", floor)]
+        while True:
+            path = path.rpartition("/")[0]
+            if not path:
+                return tuple(generation)
+            generation.append(generations.get(path, floor))
+
+    def _bump(self, path):
+        self._generation += 1
+        generations = self._generations
+        keys = [path]
+        while path:
+            keys.append(path + "/")
+            path = path.rpartition("/")[0]
+        for key in keys:
+            generations[key] = self._generation
+            generations.move_to_end(key)
+        # values of forgotten paths are at most the floor, lookups of
+        # them return it and never go back to an earlier value
+        while len(generations) > self.maxsize * 4:
+            self._floor = generations.popitem(last=False)[1]
+
+    def invalidate(self, path):
+        """Drop cached responses affected by a write request to the path"""
+        path = path.split("?", 1)[0].rstrip("/")
+        paths = [path]
+        for pattern, extra in self.invalidations:
+            if pattern.match(path):
+                paths.extend(extra)
+        for p in paths:
+            self._bump(p)
+
+        for key in [k for k, e in self._entries.items()
+                    if any(e[1] == p or e[1].startswith(p + "/") or
+                           p.startswith(e[1] + "/") for p in paths)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class ValidatorStore:
+    """Bounded LRU store of `ETag` and `Last-Modified` validators with the
+    parsed responses they belong to.
+
+    Used to send conditional GET requests, a `304 Not Modified` reply is
+    served from the stored object without downloading and decoding the
+    body again.
+
+    :param maxsize: (optional) maximum number of stored responses
+
+    Usage::
+
+    >>> c = await atoot.MastodonAPI.create(instance, access_token=token,
+    >>>                                    conditional=True)
+    >>> peers = await c.instance_peers()
+    >>> peers = await c.instance_peers()  # 304, same object is returned
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.revalidated = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return (etag, last_modified, content) tuple or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, etag, last_modified, content):
+        self._entries[key] = (etag, last_modified, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
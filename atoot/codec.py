@@ -0,0 +1,23 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+# The fastest available codec, both loads functions accept bytes
+if orjson is not None:
+    loads, dumps = orjson.loads, orjson.dumps
+elif ujson is not None:
+    loads, dumps = ujson.loads, ujson.dumps
+else:
+    loads, dumps = json.loads, _json_dumps
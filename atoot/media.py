@@ -0,0 +1,135 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+
+CHUNK_SIZE = 256 * 1024
+
+
+def _quote(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class Upload:
+    """Streaming multipart/form-data body with one file and text fields.
+
+    The file is sent in chunks as it is read and never buffered as a whole.
+    Sources can be:
+
+    * a path (str or os.PathLike), read in a thread off the event loop
+    * bytes, bytearray or memoryview, sent as slices without copying
+    * a binary file object, read in a thread off the event loop
+    * an asynchronous iterator of bytes, pass `size` to send it with a
+      known Content-Length, otherwise the body is sent chunked
+
+    Paths, byte buffers and seekable file objects can be sent again when a
+    request is retried, asynchronous iterators can't.
+
+    :param source: file to upload
+    :param fields: (optional) dict of other form fields, i.e. description
+    :param filename: (optional) file name sent to the server, the default is the base name of the path
+    :param content_type: (optional) MIME type of the file, guessed from the file name by default
+    :param size: (optional) number of bytes in an asynchronous iterator
+    :param progress: (optional) function called with (bytes sent, total bytes or None) after every chunk
+    :param chunk_size: (optional) number of bytes read at a time
+    """
+
+    def __init__(self, source, fields=None, filename=None, content_type=None,
+            size=None, progress=None, chunk_size=CHUNK_SIZE):
+        self.source = source
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self._offset = None
+
+        if isinstance(source, (str, os.PathLike)):
+            name = os.fspath(source)
+            size = os.stat(name).st_size
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            name = None
+            size = memoryview(source).nbytes
+        elif hasattr(source, "read"):
+            name = getattr(source, "name", None)
+            if size is None:
+                try:
+                    self._offset = source.tell()
+                    size = os.fstat(source.fileno()).st_size - self._offset
+                except (AttributeError, OSError, ValueError):
+                    self._offset = None
+        elif hasattr(source, "__aiter__"):
+            name = None
+        else:
+            raise TypeError("Can't upload %r" % type(source).__name__)
+
+        if filename is None:
+            filename = os.path.basename(name) if type(name) == str else "file"
+        if content_type is None:
+            content_type = mimetypes.guess_type(filename)[0] or \
+                    "application/octet-stream"
+
+        head = []
+        for key, value in (fields or {}).items():
+            if value is None:
+                continue
+            head.append('--%s\r\nContent-Disposition: form-data; name="%s"'
+                        '\r\n\r\n%s\r\n' % (self.boundary, _quote(key), value))
+        head.append('--%s\r\nContent-Disposition: form-data; name="file"; '
+                    'filename="%s"\r\nContent-Type: %s\r\n\r\n' % (
+                    self.boundary, _quote(filename), content_type))
+        self._head = "".join(head).encode()
+        self._tail = ("\r\n--%s--\r\n" % self.boundary).encode()
+        self.size = size
+        self.length = None if size is None else \
+                len(self._head) + size + len(self._tail)
+
+    @property
+    def replayable(self):
+        """Body can be generated again for a retry"""
+        return not hasattr(self.source, "__aiter__") and \
+                (not hasattr(self.source, "read") or self._offset is not None)
+
+    @property
+    def headers(self):
+        headers = {"Content-Type":
+                   "multipart/form-data; boundary=%s" % self.boundary}
+        if self.length is not None:
+            headers["Content-Length"] = str(self.length)
+        return headers
+
+    async def _chunks(self):
+        source, size = self.source, self.chunk_size
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source).cast("B")
+            for i in range(0, len(view), size):
+                yield view[i:i + size]
+        elif hasattr(source, "__aiter__"):
+            async for chunk in source:
+                yield chunk
+        else:
+            loop = asyncio.get_running_loop()
+            if hasattr(source, "read"):
+                f = source
+                if self._offset is not None:
+                    f.seek(self._offset)
+            else:
+                f = await loop.run_in_executor(None, open, source, "rb")
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(None, f.read, size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                if f is not source:
+                    await loop.run_in_executor(None, f.close)
+
+    async def body(self):
+        """Asynchronous iterator of the request body"""
+        sent = 0
+        yield self._head
+        async for chunk in self._chunks():
+            yield chunk
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(sent, self.size)
+        yield self._tail
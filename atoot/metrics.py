@@ -0,0 +1,211 @@
+import re
+import time
+
+from bisect import bisect_left
+from functools import lru_cache
+
+import aiohttp
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, float("inf"))
+
+_ID_RE = re.compile(r"/(\d+|[0-9a-f]{8}-[0-9a-f-]{27})(?=/|$)")
+_NAME_RE = re.compile(r"^(/api/v1/(?:timelines/tag|timelines/list|"
+                      r"featured_tags|domain_blocks|markers))/[^/]+")
+
+
+@lru_cache(maxsize=1024)
+def endpoint_template(path):
+    """Replace ids in the path with placeholders, i.e.
+    '/api/v1/statuses/123/favourite' -> '/api/v1/statuses/:id/favourite'"""
+    path = path.split("?", 1)[0].rstrip("/") or "/"
+    path = _NAME_RE.sub(r"\1/:name", path)
+    return _ID_RE.sub("/:id", path)
+
+
+class RequestSample:
+    """Measurements of one HTTP request, passed to the hooks.
+
+    Timings are in seconds, None when not measured: `dns` and `connect` are
+    only set for new connections, `connect` includes the TLS handshake.
+    `ttfb` is the time until the response headers are received, `elapsed`
+    the time until the body is read.
+    """
+    __slots__ = ("method", "endpoint", "status", "bytes", "error", "started",
+                 "elapsed", "dns", "connect", "ttfb", "decode",
+                 "ratelimit_remaining", "_dns_start", "_connect_start")
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint
+        self.status = None
+        self.bytes = 0
+        self.error = None
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.dns = self.connect = self.ttfb = self.decode = None
+        self.ratelimit_remaining = None
+
+
+class EndpointStats:
+    """Aggregated measurements of one endpoint template"""
+    __slots__ = ("count", "errors", "statuses", "bytes", "time", "max_time",
+                 "histogram", "dns", "connect", "ttfb", "decode",
+                 "ratelimit_remaining")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.bytes = 0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.dns = self.connect = self.ttfb = self.decode = 0.0
+        self.ratelimit_remaining = None
+
+    def add(self, sample):
+        self.count += 1
+        if sample.error is not None or \
+                (sample.status is not None and sample.status >= 400):
+            self.errors += 1
+        if sample.status is not None:
+            self.statuses[sample.status] = \
+                    self.statuses.get(sample.status, 0) + 1
+        self.bytes += sample.bytes
+        self.time += sample.elapsed
+        if sample.elapsed > self.max_time:
+            self.max_time = sample.elapsed
+        self.histogram[bisect_left(LATENCY_BUCKETS, sample.elapsed)] += 1
+        if sample.dns is not None: self.dns += sample.dns
+        if sample.connect is not None: self.connect += sample.connect
+        if sample.ttfb is not None: self.ttfb += sample.ttfb
+        if sample.decode is not None: self.decode += sample.decode
+        if sample.ratelimit_remaining is not None:
+            self.ratelimit_remaining = sample.ratelimit_remaining
+
+    def quantile(self, q):
+        """Estimate latency quantile (0..1) from the histogram, returns the
+        upper bound of the bucket"""
+        rank = q * self.count
+        total = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.histogram):
+            total += n
+            if total >= rank and total:
+                return bound if bound != float("inf") else self.max_time
+        return 0.0
+
+    def to_dict(self):
+        count = self.count or 1
+        return {"count": self.count, "errors": self.errors,
+                "statuses": dict(self.statuses), "bytes": self.bytes,
+                "avg_time": self.time / count, "max_time": self.max_time,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99),
+                "avg_dns": self.dns / count,
+                "avg_connect": self.connect / count,
+                "avg_ttfb": self.ttfb / count,
+                "avg_decode": self.decode / count,
+                "ratelimit_remaining": self.ratelimit_remaining}
+
+
+class Metrics:
+    """Per-endpoint request metrics: counts, status codes, bytes, latency
+    histogram, connection and JSON decoding timings and rate limit headroom.
+
+    Endpoints are grouped by template, with ids replaced by placeholders.
+    Hooks are called with a RequestSample after every request, to export
+    the measurements to Prometheus, OpenTelemetry, etc. Exceptions raised
+    by hooks don't fail the request, they are counted in `hook_errors` and
+    the last one is kept in `last_hook_error`.
+
+    Connection timings come from an aiohttp TraceConfig, which is added to
+    the session created by :meth:`MastodonAPI.create`. When passing your
+    own session, create it with `trace_configs=[metrics.trace_config()]`.
+
+    :param hooks: (optional) list of functions called with a RequestSample
+
+    Usage::
+
+    >>> metrics = atoot.Metrics()
+    >>> c = await atoot.MastodonAPI.create(instance, access_token=token,
+    >>>                                    metrics=metrics)
+    >>> await c.home_timeline()
+    >>> print(metrics.stats()["GET /api/v1/timelines/home"])
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or ())
+        self.endpoints = {}
+        self.hook_errors = 0
+        self.last_hook_error = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def start(self, method, path):
+        return RequestSample(method, endpoint_template(path))
+
+    def finish(self, sample, error=None):
+        sample.elapsed = time.perf_counter() - sample.started
+        if error is not None:
+            sample.error = error
+        key = (sample.method, sample.endpoint)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        stats.add(sample)
+        for hook in self.hooks:
+            try:
+                hook(sample)
+            except Exception as e:
+                self.hook_errors += 1
+                self.last_hook_error = e
+
+    def stats(self):
+        """Dict of "METHOD /endpoint/template" -> dict of aggregated values"""
+        return {"%s %s" % key: stats.to_dict()
+                for key, stats in self.endpoints.items()}
+
+    def clear(self):
+        self.endpoints.clear()
+
+    def trace_config(self):
+        """aiohttp.TraceConfig filling connection timings of the samples"""
+        config = aiohttp.TraceConfig()
+        config.on_dns_resolvehost_start.append(_dns_start)
+        config.on_dns_resolvehost_end.append(_dns_end)
+        config.on_connection_create_start.append(_connect_start)
+        config.on_connection_create_end.append(_connect_end)
+        config.on_request_end.append(_request_end)
+        return config
+
+
+def _sample(ctx):
+    sample = ctx.trace_request_ctx
+    return sample if type(sample) is RequestSample else None
+
+async def _dns_start(session, ctx, params):
+    sample = _sample(ctx)
+    if sample is not None:
+        sample._dns_start = time.perf_counter()
+
+async def _dns_end(session, ctx, params):
+    sample = _sample(ctx)
+    if sample is not None:
+        sample.dns = time.perf_counter() - sample._dns_start
+
+async def _connect_start(session, ctx, params):
+    sample = _sample(ctx)
+    if sample is not None:
+        sample._connect_start = time.perf_counter()
+
+async def _connect_end(session, ctx, params):
+    sample = _sample(ctx)
+    if sample is not None:
+        sample.connect = time.perf_counter() - sample._connect_start
+
+async def _request_end(session, ctx, params):
+    sample = _sample(ctx)
+    if sample is not None:
+        sample.ttfb = time.perf_counter() - sample.started
@@ -0,0 +1,229 @@
+import re
+
+from collections import UserList
+
+
+class _Lazy:
+    """Descriptor which converts a nested dict (or list of dicts) to an
+    entity on first access."""
+    __slots__ = ("slot", "model")
+
+    def __init__(self, slot, model):
+        self.slot = slot
+        self.model = model
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is dict:
+            value = MODELS[self.model](value)
+            setattr(obj, self.slot, value)
+        elif type(value) is list and value and type(value[0]) is dict:
+            model = MODELS[self.model]
+            value = [model(v) for v in value]
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+class _EntityMeta(type):
+    """Builds __slots__ from the `_fields` list of an entity class, nested
+    fields are stored in private slots behind a _Lazy descriptor."""
+
+    def __new__(mcs, name, bases, ns):
+        fields = tuple(ns.get("_fields", ()))
+        nested = ns.get("_nested", {})
+        ns["_slotmap"] = tuple((f, "_" + f if f in nested else f)
+                               for f in fields)
+        ns["_fieldset"] = frozenset(fields)
+        if "__slots__" not in ns:
+            ns["__slots__"] = tuple(slot for _, slot in ns["_slotmap"])
+        cls = super().__new__(mcs, name, bases, ns)
+        for field, model in nested.items():
+            setattr(cls, field, _Lazy("_" + field, model))
+        return cls
+
+
+class Entity(metaclass=_EntityMeta):
+    """Base class for typed API entities.
+
+    Known fields are attributes, unknown fields sent by newer servers are
+    kept in a separate dict. Read-only dict access is supported for
+    compatibility with code written for plain dict results. Known fields
+    missing from the payload are None as attributes, but aren't keys.
+    """
+    __slots__ = ("_extra", "_missing")
+    _fields = ()
+    _nested = {}
+
+    def __init__(self, data):
+        for field, slot in self._slotmap:
+            setattr(self, slot, data.get(field))
+        if len(data) > len(self._slotmap) or \
+                not self._fieldset.issuperset(data):
+            self._extra = {k: v for k, v in data.items()
+                           if k not in self._fieldset}
+        else:
+            self._extra = None
+        # known fields absent from the payload, None if there are none
+        self._missing = self._fieldset.difference(data) or None
+
+    def __getitem__(self, key):
+        if key in self._fieldset:
+            if self._missing is not None and key in self._missing:
+                raise KeyError(key)
+            return getattr(self, key)
+        if self._extra is not None:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in self._fieldset:
+            return self._missing is None or key not in self._missing
+        return self._extra is not None and key in self._extra
+
+    def keys(self):
+        missing = self._missing or ()
+        keys = [f for f, _ in self._slotmap if f not in missing]
+        if self._extra is not None:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._slotmap) - len(self._missing or ()) + \
+                len(self._extra or ())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def to_dict(self):
+        """Convert the entity back to a plain dict"""
+        result = {}
+        missing = self._missing or ()
+        for field, _ in self._slotmap:
+            if field in missing:
+                continue
+            value = getattr(self, field)
+            if isinstance(value, Entity):
+                value = value.to_dict()
+            elif type(value) is list and value and \
+                    isinstance(value[0], Entity):
+                value = [v.to_dict() for v in value]
+            result[field] = value
+        if self._extra is not None:
+            result.update(self._extra)
+        return result
+
+    def __eq__(self, other):
+        if isinstance(other, Entity):
+            other = other.to_dict()
+        if type(other) is not dict:
+            return NotImplemented
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(id=%r)" % (type(self).__name__, self.get("id"))
+
+
+class Account(Entity):
+    _fields = ("id", "username", "acct", "display_name", "locked", "bot",
+            "discoverable", "group", "created_at", "note", "url", "avatar",
+            "avatar_static", "header", "header_static", "followers_count",
+            "following_count", "statuses_count", "last_status_at", "emojis",
+            "fields", "source", "moved")
+    _nested = {"moved": "Account"}
+
+
+class MediaAttachment(Entity):
+    _fields = ("id", "type", "url", "preview_url", "remote_url", "text_url",
+            "meta", "description", "blurhash")
+
+
+class Poll(Entity):
+    _fields = ("id", "expires_at", "expired", "multiple", "votes_count",
+            "voters_count", "voted", "own_votes", "options", "emojis")
+
+
+class Status(Entity):
+    _fields = ("id", "uri", "created_at", "account", "content", "visibility",
+            "sensitive", "spoiler_text", "media_attachments", "application",
+            "mentions", "tags", "emojis", "reblogs_count", "favourites_count",
+            "replies_count", "url", "in_reply_to_id", "in_reply_to_account_id",
+            "reblog", "poll", "card", "language", "text", "favourited",
+            "reblogged", "muted", "bookmarked", "pinned")
+    _nested = {"account": "Account", "reblog": "Status", "poll": "Poll",
+            "media_attachments": "MediaAttachment"}
+
+
+class Notification(Entity):
+    _fields = ("id", "type", "created_at", "account", "status")
+    _nested = {"account": "Account", "status": "Status"}
+
+
+class Relationship(Entity):
+    _fields = ("id", "following", "showing_reblogs", "notifying",
+            "followed_by", "blocking", "blocked_by", "muting",
+            "muting_notifications", "requested", "domain_blocking",
+            "endorsed", "note")
+
+
+MODELS = {m.__name__: m for m in
+          (Account, MediaAttachment, Poll, Status, Notification, Relationship)}
+
+# Entity type returned by an endpoint
+ENDPOINT_MODELS = [(re.compile(p), m) for p, m in (
+    (r"/api/v1/statuses/?$", Status),
+    (r"/api/v1/statuses/[^/]+/?$", Status),
+    (r"/api/v1/statuses/[^/]+/(un)?(favourite|reblog|bookmark|mute|pin)$",
+        Status),
+    (r"/api/v1/statuses/[^/]+/(reblogged_by|favourited_by)$", Account),
+    (r"/api/v1/timelines/", Status),
+    (r"/api/v1/accounts/[^/]+/statuses$", Status),
+    (r"/api/v1/(favourites|bookmarks)$", Status),
+    (r"/api/v1/notifications(/(?!clear)[^/]+)?$", Notification),
+    (r"/api/v1/accounts/relationships$", Relationship),
+    (r"/api/v1/accounts/[^/]+/(un)?(follow|block|mute|pin)$", Relationship),
+    (r"/api/v1/accounts/[^/]+/(followers|following)$", Account),
+    (r"/api/v1/accounts/(verify|update)_credentials$", Account),
+    (r"/api/v1/accounts/search$", Account),
+    (r"/api/v1/accounts/[^/]+/?$", Account),
+    (r"/api/v1/(mutes|blocks|follow_requests|endorsements)$", Account),
+    (r"/api/v1/lists/[^/]+/accounts$", Account),
+    (r"/api/v[12]/media(/[^/]+)?$", MediaAttachment),
+    (r"/api/v1/polls/[^/]+(/votes)?$", Poll),
+)]
+
+def model_for(path):
+    """Return entity class for the endpoint or None"""
+    path = path.split("?", 1)[0]
+    for pattern, model in ENDPOINT_MODELS:
+        if pattern.match(path):
+            return model
+    return None
+
+def to_models(content, model):
+    """Convert parsed reply to entities, in place for lists"""
+    if isinstance(content, (list, UserList)):
+        data = content.data if isinstance(content, UserList) else content
+        data[:] = [model(v) if type(v) is dict else v for v in data]
+        return content
+    if type(content) is dict and "id" in content:
+        return model(content)
+    return content
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+import aiohttp
+
+from atoot.api import MastodonAPI, __useragent__
+from atoot.metrics import Metrics
+
+
+class ClientPool:
+    """Pool of MastodonAPI clients for many accounts on many instances,
+    sharing one aiohttp session and its connection pool.
+
+    Connections, keep-alive and the DNS cache are shared, while every client
+    keeps its own access token, rate limit state and caches. Cookies are not
+    stored, so accounts can't leak into each other's requests.
+
+    :param limit: (optional) maximum number of open connections in total
+    :param limit_per_host: (optional) maximum number of open connections per instance
+    :param keepalive_timeout: (optional) seconds to keep idle connections open
+    :param ttl_dns_cache: (optional) seconds to cache DNS lookups, None to cache forever
+    :param client_kwargs: (optional) default keyword arguments for :meth:`MastodonAPI.create`, i.e. ratelimit=True, objects like RateLimiter instances are shared by all clients
+
+    Usage::
+
+    >>> async with atoot.ClientPool(limit_per_host=8, ratelimit=True) as pool:
+    >>>     bot = await pool.client("botsin.space", access_token=token)
+    >>>     print(await bot.verify_account_credentials())
+    >>>     print(pool.stats())
+    """
+
+    def __init__(self, limit=100, limit_per_host=10, keepalive_timeout=30,
+            ttl_dns_cache=300, **client_kwargs):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.client_kwargs = client_kwargs
+        self.session = None
+        self._clients = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=self.ttl_dns_cache)
+            metrics = self.client_kwargs.get("metrics")
+            if metrics and not isinstance(metrics, Metrics):
+                metrics = Metrics()
+            self.session = aiohttp.ClientSession(connector=connector,
+                    cookie_jar=aiohttp.DummyCookieJar(),
+                    headers={"user-agent": __useragent__}, trace_configs=
+                    [metrics.trace_config()] if metrics else None)
+        return self.session
+
+    async def client(self, instance, access_token=None, **kwargs):
+        """Return MastodonAPI client for the account, the same object is
+        returned for the same instance and access token.
+
+        Arguments are the same as for :meth:`MastodonAPI.create`, except
+        `session`, and override the pool defaults.
+        """
+        key = (instance, access_token)
+        c = self._clients.get(key)
+        if c is None:
+            options = dict(self.client_kwargs, **kwargs)
+            c = await MastodonAPI.create(instance, access_token=access_token,
+                    session=self._get_session(), **options)
+            c._pool = self
+            self._clients[key] = c
+        return c
+
+    def release(self, c):
+        """Remove client from the pool, connections stay open for others"""
+        key = (c.instance, c.get_access_token())
+        if self._clients.get(key) is c:
+            del self._clients[key]
+
+    async def close(self):
+        """Close all connections, clients of the pool can't be used after"""
+        self._clients.clear()
+        if self.session is not None:
+            await self.session.close()
+
+    def stats(self):
+        """Number of connections per host: {host: {"active": n, "idle": m}},
+        empty if the aiohttp version doesn't expose them"""
+        result = defaultdict(lambda: {"active": 0, "idle": 0})
+        if self.session is None or self.session.closed:
+            return {}
+        # aiohttp has no public API for this, private attributes may be
+        # missing in other versions
+        connector = self.session.connector
+        acquired = getattr(connector, "_acquired_per_host", None) or {}
+        idle = getattr(connector, "_conns", None) or {}
+        for key, conns in acquired.items():
+            if conns:
+                result[key.host]["active"] += len(conns)
+        for key, conns in idle.items():
+            if conns:
+                result[key.host]["idle"] += len(conns)
+        return dict(result)
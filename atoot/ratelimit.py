@@ -0,0 +1,135 @@
+import asyncio
+import re
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Mastodon's default limits: (name, method, path regex, limit, period seconds)
+DEFAULT_BUCKETS = (
+    ("media", "POST", r"/api/v[12]/media$", 30, 30 * 60),
+    ("status_delete", "DELETE", r"/api/v1/statuses/[^/]+$", 30, 30 * 60),
+    ("status_delete", "POST", r"/api/v1/statuses/[^/]+/unreblog$", 30, 30 * 60),
+)
+
+def parse_iso_date(value):
+    """Parse ISO 8601 datetime as returned by Mastodon, i.e.
+    '2020-07-04T12:00:00.608Z'"""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+def seconds_until_reset(reset, server_date=None):
+    """Number of seconds left until `X-RateLimit-Reset`.
+
+    When the server `Date` header is known, both values come from the
+    server clock, so the difference is not affected by local clock skew.
+    """
+    try:
+        reset = parse_iso_date(reset)
+        if server_date:
+            now = parsedate_to_datetime(server_date)
+        else:
+            now = datetime.now(timezone.utc)
+        return max((reset - now).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled at a steady `limit / period` rate.
+
+    Tokens are reserved in advance, so concurrent callers get increasing
+    delays instead of racing for the same token.
+    """
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        rate = self.limit / self.period
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token, return number of seconds to wait before using it"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        delay = max(self.blocked_until - now, 0.0)
+        if self.tokens < 0:
+            delay = max(delay, -self.tokens * self.period / self.limit)
+        return delay
+
+    def sync(self, limit=None, remaining=None, reset_in=None):
+        """Correct bucket state with values reported by the server"""
+        now = time.monotonic()
+        self._refill(now)
+        if limit:
+            self.limit = limit
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset_in is not None:
+                self.blocked_until = max(self.blocked_until, now + reset_in)
+
+
+class RateLimiter:
+    """Paces API requests using the X-RateLimit-* headers, so that the
+    client slows down before the server starts to reply with 429.
+
+    :param limit: (optional) requests per period for the general bucket, default is 300
+    :param period: (optional) general bucket period in seconds, default is 300
+    :param buckets: (optional) stricter per-endpoint buckets, a list of (name, method, path regex, limit, period) tuples
+
+    Usage::
+
+    >>> c = await atoot.MastodonAPI.create(instance, access_token=token,
+    >>>                                    ratelimit=True)
+    """
+
+    def __init__(self, limit=300, period=300, buckets=DEFAULT_BUCKETS):
+        self.default = TokenBucket(limit, period)
+        self.buckets = {}
+        self._rules = []
+        for name, method, path, b_limit, b_period in buckets:
+            if name not in self.buckets:
+                self.buckets[name] = TokenBucket(b_limit, b_period)
+            self._rules.append((method, re.compile(path), self.buckets[name]))
+
+    def bucket_for(self, method, path):
+        """Return endpoint-specific bucket or None"""
+        path = path.split("?", 1)[0]
+        for rule_method, pattern, bucket in self._rules:
+            if rule_method == method and pattern.match(path):
+                return bucket
+        return None
+
+    async def acquire(self, method, path):
+        """Wait until a request to the endpoint is allowed"""
+        delay = self.default.reserve()
+        bucket = self.bucket_for(method, path)
+        if bucket is not None:
+            delay = max(delay, bucket.reserve())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, method, path, headers):
+        """Update bucket state from response headers"""
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        try:
+            limit = int(headers.get("X-RateLimit-Limit", 0))
+            remaining = int(headers["X-RateLimit-Remaining"])
+        except ValueError:
+            return
+        reset_in = None
+        if "X-RateLimit-Reset" in headers:
+            reset_in = seconds_until_reset(headers["X-RateLimit-Reset"],
+                                           headers.get("Date"))
+
+        bucket = self.bucket_for(method, path) or self.default
+        bucket.sync(limit, remaining, reset_in)
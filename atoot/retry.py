@@ -0,0 +1,108 @@
+import random
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from atoot.ratelimit import seconds_until_reset
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+def parse_retry_after(value):
+    """Parse Retry-After header, either delay in seconds or HTTP date"""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Retry rules for transient failures: network errors and 429, 502, 503,
+    504 replies.
+
+    Requests are retried with exponential backoff and full jitter, unless
+    the server tells when to come back with `Retry-After` or, for 429
+    replies, `X-RateLimit-Reset`.
+
+    Non-idempotent requests (POST, PATCH) are only retried after 429, when
+    the server has rejected them, or when they carry an `Idempotency-Key`
+    header, like :meth:`MastodonAPI.create_status` does.
+
+    :param max_attempts: (optional) maximum number of attempts, including the first one
+    :param backoff: (optional) base backoff delay in seconds
+    :param max_backoff: (optional) maximum backoff delay in seconds
+    :param max_retry_after: (optional) don't wait longer than this for the delay requested by the server, give up instead
+    :param statuses: (optional) HTTP status codes to retry
+    :param overrides: (optional) dict of per-endpoint policies, keys are path prefixes optionally preceded by a method, i.e. "POST /api/v1/media", values are RetryPolicy instances or None to disable retries
+
+    Usage::
+
+    >>> policy = atoot.RetryPolicy(max_attempts=5,
+    >>>     overrides={"POST /api/v1/media": None})
+    >>> c = await atoot.MastodonAPI.create(instance, access_token=token,
+    >>>                                    retry=policy)
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30.0,
+            max_retry_after=300.0, statuses=(429, 502, 503, 504),
+            overrides=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+        self.overrides = sorted((overrides or {}).items(),
+                                key=lambda o: len(o[0]), reverse=True)
+
+    def for_request(self, method, path):
+        """Return the policy which applies to the endpoint"""
+        path = path.split("?", 1)[0]
+        for key, policy in self.overrides:
+            if " " in key:
+                o_method, o_path = key.split(" ", 1)
+                if o_method != method:
+                    continue
+            else:
+                o_path = key
+            if path.startswith(o_path):
+                return policy
+        return self
+
+    def can_retry(self, attempt, method, status=None, idempotent=False):
+        """Decide if a failed request can be sent again.
+
+        :param attempt: number of attempts made so far
+        :param method: HTTP method
+        :param status: (optional) reply status, None for network errors
+        :param idempotent: (optional) request is safe to repeat regardless of the method
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if status is not None and status not in self.statuses:
+            return False
+        if status == 429:
+            return True
+        return idempotent or method in IDEMPOTENT_METHODS
+
+    def delay(self, attempt, status=None, headers=None):
+        """Number of seconds to wait before the next attempt, or None if the
+        server asks to wait longer than `max_retry_after`"""
+        delay = None
+        if headers is not None:
+            if "Retry-After" in headers:
+                delay = parse_retry_after(headers["Retry-After"])
+            if delay is None and status == 429 and \
+                    "X-RateLimit-Reset" in headers:
+                delay = seconds_until_reset(headers["X-RateLimit-Reset"],
+                                            headers.get("Date"))
+        if delay is not None:
+            return delay if delay <= self.max_retry_after else None
+
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
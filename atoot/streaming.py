@@ -0,0 +1,760 @@
+import asyncio
+import json
+import random
+import re
+
+from collections import OrderedDict, deque
+from contextlib import suppress
+
+import aiohttp
+
+from atoot import codec
+from atoot.models import Entity
+
+
+_UNSET = object()
+_EVENT_RE = re.compile(r'"event"\s*:\s*"([^"\\]*)"')
+_STREAM_RE = re.compile(r'"stream"\s*:\s*(\[[^\]]*\])')
+
+class StreamEvent:
+    """Streaming API event: event type ("update", "notification", "delete",
+    etc.), its payload and the stream it belongs to.
+
+    Events created from websocket messages are decoded lazily: the event 
+    type and stream are read without decoding the message, the payload is
+    decoded on first access. For compatibility with aiohttp messages, 
+    `data`, `type` and `json()` are available too.
+    """
+    __slots__ = ("_event", "_payload", "_stream", "_message", "data", 
+                 "_loads")
+    type = aiohttp.WSMsgType.TEXT
+
+    def __init__(self, event, payload=None, stream=None):
+        self._event = event
+        self._payload = payload
+        self._stream = stream
+        self._message = None
+        self.data = None
+        self._loads = codec.loads
+
+    @classmethod
+    def from_message(cls, data, loads=codec.loads):
+        """Wrap websocket message text without decoding it"""
+        self = cls.__new__(cls)
+        self._event = self._payload = self._stream = _UNSET
+        self._message = None
+        self.data = data
+        self._loads = loads
+        return self
+
+    @classmethod
+    def from_sse(cls, event, data, loads=codec.loads):
+        """Create event from SSE event type and data, payload is decoded on
+        first access"""
+        self = cls.__new__(cls)
+        self._event = event
+        self._payload = self._stream = _UNSET
+        self._message = {"event": event, "payload": data}
+        self.data = None
+        self._loads = loads
+        return self
+
+    def json(self, *, loads=None):
+        """Decoded websocket message, payload is left as a JSON string"""
+        if self._message is None:
+            if self.data is None:
+                self._message = {"event": self._event, 
+                                 "payload": self._payload}
+                if self._stream is not None:
+                    self._message["stream"] = self._stream
+            else:
+                self._message = (loads or self._loads)(self.data)
+        return self._message
+
+    @property
+    def event(self):
+        if self._event is _UNSET:
+            match = _EVENT_RE.search(self.data)
+            self._event = match.group(1) if match else \
+                    self.json().get("event")
+        return self._event
+
+    @property
+    def stream(self):
+        if self._stream is _UNSET:
+            match = _STREAM_RE.search(self.data) if self.data else None
+            self._stream = self._loads(match.group(1)) if match else \
+                    self.json().get("stream")
+        return self._stream
+
+    @property
+    def payload(self):
+        if self._payload is _UNSET:
+            payload = self.json().get("payload")
+            if type(payload) == str and payload[:1] in ("{", "["):
+                payload = self._loads(payload)
+            self._payload = payload
+        return self._payload
+
+    def __repr__(self):
+        return "StreamEvent(%r)" % self.event
+
+
+# Server-Sent Events endpoints of the streams
+SSE_PATHS = {
+    "user": "/api/v1/streaming/user",
+    "user:notification": "/api/v1/streaming/user/notification",
+    "public": "/api/v1/streaming/public",
+    "public:local": "/api/v1/streaming/public/local",
+    "public:remote": "/api/v1/streaming/public/remote",
+    "hashtag": "/api/v1/streaming/hashtag",
+    "hashtag:local": "/api/v1/streaming/hashtag/local",
+    "list": "/api/v1/streaming/list",
+    "direct": "/api/v1/streaming/direct",
+}
+
+
+class SSEParser:
+    """Incremental text/event-stream parser.
+
+    Chunks of any size are fed as they arrive, only an incomplete last line
+    is kept between calls.
+
+    :param loads: (optional) JSON decoder for the payloads
+    :param events: (optional) event types to return, data of other events is not accumulated
+    """
+
+    def __init__(self, loads=codec.loads, events=None):
+        self.loads = loads
+        self.events = events
+        self._tail = b""
+        self._event = None
+        self._data = []
+        self._skip = False
+
+    def feed(self, chunk):
+        """Parse a chunk of bytes, return a list of complete StreamEvents"""
+        result = []
+        lines = (self._tail + chunk).split(b"\n") if self._tail \
+                else chunk.split(b"\n")
+        self._tail = lines.pop()
+        for line in lines:
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                if self._data and not self._skip:
+                    result.append(StreamEvent.from_sse(self._event or 
+                            "message", b"\n".join(self._data).decode(),
+                            self.loads))
+                self._event = None
+                self._data = []
+                self._skip = False
+            elif line[:1] == b":":
+                continue
+            else:
+                field, _, value = line.partition(b":")
+                if value[:1] == b" ":
+                    value = value[1:]
+                if field == b"event":
+                    self._event = value.decode()
+                    self._skip = self.events is not None and \
+                            self._event not in self.events
+                elif field == b"data" and not self._skip:
+                    self._data.append(value)
+        return result
+
+
+class EventStream:
+    """Streaming API connection, asynchronous context manager and iterator
+    of StreamEvent objects.
+
+    Events are received over a websocket or as Server-Sent Events. With the
+    "auto" transport, SSE is used when the websocket handshake fails, i.e. 
+    behind a proxy which doesn't support websockets.
+
+    :param connect: function returning aiohttp websocket context manager
+    :param loads: (optional) JSON decoder
+    :param events: (optional) event types to deliver, others are skipped without decoding
+    :param connect_sse: (optional) function returning aiohttp request context manager for the SSE endpoint
+    :param transport: (optional) "websocket", "sse" or "auto"
+    """
+
+    def __init__(self, connect, loads=codec.loads, events=None, 
+            connect_sse=None, transport="websocket"):
+        self._connect = connect
+        self._connect_sse = connect_sse
+        self._cm = None
+        self.loads = loads
+        self.events = frozenset(events) if events else None
+        self.transport = transport
+        self.ws = None
+        self.response = None
+
+    async def __aenter__(self):
+        if self.transport in ("websocket", "auto"):
+            try:
+                self._cm = self._connect()
+                self.ws = await self._cm.__aenter__()
+                self.transport = "websocket"
+                return self
+            except aiohttp.WSServerHandshakeError as e:
+                if self.transport != "auto" or self._connect_sse is None \
+                        or e.status in (401, 403):
+                    raise
+
+        self._cm = self._connect_sse()
+        self.response = await self._cm.__aenter__()
+        self.transport = "sse"
+        try:
+            self.response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            await self._cm.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._cm.__aexit__(*exc)
+
+    def __aiter__(self):
+        return self.iter_events()
+
+    async def iter_events(self):
+        loads, events = self.loads, self.events
+        if self.ws is None:
+            parser = SSEParser(loads, events)
+            async for chunk in self.response.content.iter_any():
+                for event in parser.feed(chunk):
+                    yield event
+            return
+
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            event = StreamEvent.from_message(msg.data, loads)
+            if events is None or event.event in events:
+                yield event
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        else:
+            self.response.close()
+
+
+def backoff_delay(attempt, backoff, max_backoff):
+    """Exponential reconnect delay with jitter"""
+    delay = min(max_backoff, backoff * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+def is_transient(e):
+    """Errors worth reconnecting after: network errors, timeouts and 429 or
+    5xx replies. Auth errors, other client errors and bugs are not."""
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status == 429 or e.status >= 500
+    if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+        return True
+    # imported here, atoot.api imports this module
+    from atoot.api import MastodonError, NetworkError
+    if isinstance(e, NetworkError):
+        return True
+    if isinstance(e, MastodonError) and e.args and type(e.args[0]) == int:
+        return e.args[0] == 429 or e.args[0] >= 500
+    return False
+
+def id_key(_id):
+    """Sort key for Mastodon ids, which are numeric strings of any length"""
+    _id = str(_id)
+    return (len(_id), _id) if _id.isdigit() else (0, _id)
+
+# REST endpoints with the same content as a stream, used to fill the gaps
+# after reconnects: stream -> [(event, method name, args, params)]
+BACKFILL = {
+    "user": [("update", "home_timeline", (), {}),
+             ("notification", "get_notifications", (), {})],
+    "user:notification": [("notification", "get_notifications", (), {})],
+    "public": [("update", "public_timeline", (), {})],
+    "public:local": [("update", "public_timeline", (), {"local": "true"})],
+    "hashtag": [("update", "hashtag_timeline", ("tag",), {})],
+    "hashtag:local": [("update", "hashtag_timeline", ("tag",),
+                       {"local": "true"})],
+    "list": [("update", "list_timeline", ("list",), {})],
+}
+
+
+class ManagedStream:
+    """Streaming API connection which reconnects automatically.
+
+    Ids of the last received statuses and notifications are tracked, after
+    a reconnect the events missed during the outage are fetched from the
+    matching REST timeline and delivered first. Duplicate events are
+    dropped, so the consumer gets a gap-free feed.
+
+    Use :meth:`MastodonAPI.managed_stream` to create it.
+    """
+
+    def __init__(self, client, stream, list_filter=None, tag_filter=None,
+            events=None, backfill=True, max_backfill_pages=10, backoff=1.0,
+            max_backoff=60.0, seen_size=1000, heartbeat=30.0):
+        self.client = client
+        self.stream = stream
+        self.list_filter = list_filter
+        self.tag_filter = tag_filter
+        self.events_filter = frozenset(events) if events else None
+        self.backfill = backfill
+        self.max_backfill_pages = max_backfill_pages
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.seen_size = seen_size
+        self.heartbeat = heartbeat
+        self.last_ids = {}
+        self.reconnects = 0
+        self._seen = OrderedDict()
+
+    def __aiter__(self):
+        return self.events()
+
+    def _accept(self, event):
+        """Track ids of status and notification events, drop duplicates"""
+        if event.event not in ("update", "notification") or \
+                not isinstance(event.payload, (dict, Entity)) or \
+                "id" not in event.payload:
+            return True
+        key = (event.event, event.payload["id"])
+        if key in self._seen:
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.seen_size:
+            self._seen.popitem(last=False)
+
+        last = self.last_ids.get(event.event)
+        if last is None or id_key(key[1]) > id_key(last):
+            self.last_ids[event.event] = key[1]
+        return True
+
+    async def _backfill(self):
+        """Yield events newer than the last seen ones, oldest first"""
+        filters = {"tag": self.tag_filter, "list": self.list_filter}
+        for event, method, args, params in BACKFILL.get(self.stream, ()):
+            last = self.last_ids.get(event)
+            if last is None or (self.events_filter is not None and 
+                                event not in self.events_filter):
+                continue
+            # min_id returns the page right after the last seen item,
+            # "previous" links continue towards the newest items
+            page = await getattr(self.client, method)(
+                    *[filters[a] for a in args],
+                    params=dict(params, min_id=last))
+            n_pages = 1
+            while len(page) > 0:
+                for item in sorted(page, key=lambda i: id_key(i["id"])):
+                    yield StreamEvent(event, item)
+                if not page.previous or n_pages >= self.max_backfill_pages:
+                    break
+                page = await self.client.get_previous(page)
+                n_pages += 1
+
+    async def events(self):
+        """Asynchronous iterator over StreamEvent objects"""
+        attempt = 0
+        connected = False
+        while True:
+            try:
+                async with self.client.streaming(self.stream,
+                        list_filter=self.list_filter,
+                        tag_filter=self.tag_filter,
+                        events=self.events_filter,
+                        heartbeat=self.heartbeat) as stream:
+                    attempt = 0
+                    if connected and self.backfill:
+                        async for event in self._backfill():
+                            if self._accept(event):
+                                yield event
+                    connected = True
+                    async for event in stream:
+                        if self._accept(event):
+                            yield event
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+
+            attempt += 1
+            self.reconnects += 1
+            await asyncio.sleep(backoff_delay(attempt, self.backoff, 
+                                              self.max_backoff))
+
+
+def stream_key(stream, list_filter=None, tag_filter=None):
+    """Routing key of a stream, matches the "stream" field of events"""
+    if stream.startswith("hashtag"):
+        return (stream, str(tag_filter).lower())
+    if stream == "list":
+        return (stream, str(list_filter))
+    return (stream,)
+
+
+class Subscription:
+    """Events of one stream received by a StreamMultiplexer.
+
+    Asynchronous iterator over StreamEvent objects, which ends after
+    unsubscribing. When the queue is full, the oldest event is dropped.
+    If the multiplexer stops on a fatal error, i.e. a rejected access
+    token, the error is raised to the consumer.
+    """
+
+    def __init__(self, mux, key, params, maxsize, events=None):
+        self.mux = mux
+        self.key = key
+        self.params = params
+        self.events = frozenset(events) if events else None
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        if isinstance(event, BaseException):
+            # keep it queued, so that later calls raise it too
+            self.queue.put_nowait(event)
+            raise event
+        return event
+
+    async def get(self):
+        """Wait for the next event"""
+        return await self.__anext__()
+
+    async def unsubscribe(self):
+        await self.mux.unsubscribe(self)
+
+
+class StreamMultiplexer:
+    """Many streaming API subscriptions over one websocket connection.
+
+    Streams are subscribed and unsubscribed at runtime with the "subscribe"
+    and "unsubscribe" messages. Events are routed to per-subscription 
+    queues by their "stream" field. The connection is reopened with backoff 
+    when it drops, and all active streams are subscribed again.
+
+    Use :meth:`MastodonAPI.stream_multiplexer` to create it.
+
+    Usage::
+
+        async with client.stream_multiplexer() as mux:
+            python = await mux.subscribe("hashtag", tag_filter="python")
+            home = await mux.subscribe("user")
+            async for event in python:
+                print(event.payload["content"])
+    """
+
+    def __init__(self, client, queue_size=1000, backoff=1.0,
+            max_backoff=60.0, heartbeat=30.0):
+        self.client = client
+        self.queue_size = queue_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.heartbeat = heartbeat
+        self.reconnects = 0
+        self.error = None
+        self._subscriptions = {}
+        self._ws = None
+        self._task = None
+
+    @property
+    def url(self):
+        return "{}/api/v1/streaming/?access_token={}".format(
+                self.client.base_url, self.client.get_access_token())
+
+    async def start(self):
+        """Connect in a background task"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        """Close the connection and end all subscriptions"""
+        if self._ws is not None:
+            await self._ws.close()
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for subs in self._subscriptions.values():
+            for sub in subs:
+                sub._put(None)
+        self._subscriptions.clear()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _send(self, _type, params):
+        if self._ws is not None and not self._ws.closed:
+            with suppress(ConnectionError, RuntimeError):
+                await self._ws.send_str(json.dumps(dict(params, type=_type)))
+
+    async def subscribe(self, stream, list_filter=None, tag_filter=None,
+            events=None):
+        """Subscribe to a stream.
+
+        :params stream: one of the following: user, user:notification, public, public:local, hashtag, hashtag:local, list, direct
+        :param events: (optional) event types to deliver, others are skipped without decoding
+        :return: Subscription
+        """
+        if self.error is not None:
+            raise self.error
+        key = stream_key(stream, list_filter, tag_filter)
+        params = {"stream": stream}
+        if list_filter: params["list"] = str(list_filter)
+        if tag_filter: params["tag"] = tag_filter
+        sub = Subscription(self, key, params, self.queue_size, events)
+        subs = self._subscriptions.setdefault(key, [])
+        subs.append(sub)
+        if len(subs) == 1:
+            await self._send("subscribe", params)
+        return sub
+
+    async def unsubscribe(self, sub):
+        subs = self._subscriptions.get(sub.key, [])
+        if sub in subs:
+            subs.remove(sub)
+            sub._put(None)
+        if not subs and sub.key in self._subscriptions:
+            del self._subscriptions[sub.key]
+            await self._send("unsubscribe", sub.params)
+
+    def _route(self, event):
+        key = tuple(event.stream or ())
+        if key and key[0].startswith("hashtag") and len(key) > 1:
+            key = (key[0], key[1].lower())
+        for sub in self._subscriptions.get(key, ()):
+            if sub.events is None or event.event in sub.events:
+                sub._put(event)
+
+    def _fail(self, error):
+        """Stop on a fatal error, wake up the consumers with it"""
+        self.error = error
+        for subs in self._subscriptions.values():
+            for sub in subs:
+                sub._put(error)
+
+    async def _run(self):
+        attempt = 0
+        loads = self.client.json_loads
+        while True:
+            try:
+                async with self.client.session.ws_connect(self.url,
+                        heartbeat=self.heartbeat) as ws:
+                    self._ws = ws
+                    attempt = 0
+                    for subs in list(self._subscriptions.values()):
+                        await self._send("subscribe", subs[0].params)
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._route(StreamEvent.from_message(msg.data,
+                                                                 loads))
+            except Exception as e:
+                if not is_transient(e):
+                    self._fail(e)
+                    return
+            finally:
+                self._ws = None
+
+            attempt += 1
+            self.reconnects += 1
+            await asyncio.sleep(backoff_delay(attempt, self.backoff,
+                                              self.max_backoff))
+
+
+_CLOSED = object()
+
+class WorkQueue:
+    """Bounded FIFO queue between a stream reader and handler workers.
+
+    :param maxsize: maximum number of queued items
+    :param overflow: (optional) what to do when the queue is full: "block" waits for free space, "drop-oldest" drops the oldest item, "coalesce" replaces a queued item with the same key or drops the oldest one if there is none
+    :param key: (optional) function returning the coalescing key of an item, items are compared by their data when not set
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "coalesce")
+
+    def __init__(self, maxsize, overflow="block", key=None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: %s" % overflow)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.key = key or (lambda item: getattr(item, "data", item))
+        self.dropped = 0
+        self.coalesced = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = asyncio.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, item):
+        async with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.overflow == "block":
+                    await self._cond.wait_for(
+                            lambda: len(self._items) < self.maxsize)
+                elif self.overflow == "coalesce" and self._replace(item):
+                    return
+                else:
+                    self._items.popleft()
+                    self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def _replace(self, item):
+        key = self.key(item)
+        for i, queued in enumerate(self._items):
+            if self.key(queued) == key:
+                self._items[i] = item
+                self.coalesced += 1
+                return True
+        return False
+
+    async def get(self):
+        """Return the next item or atoot.streaming._CLOSED after close()"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._items or self._closed)
+            if not self._items:
+                return _CLOSED
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    async def close(self):
+        """Let workers finish the queued items and stop"""
+        async with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+async def run_workers(source, handler, workers, queue_size=1000,
+        overflow="block", key=None):
+    """Read items from an asynchronous iterator and process them with 
+    `workers` concurrent handler coroutines.
+
+    Without `key` all workers share one queue. With `key`, items with the 
+    same key always go to the same worker, so they are handled in order.
+    """
+    if key is None:
+        queues = [WorkQueue(queue_size, overflow)]
+    else:
+        queues = [WorkQueue(max(queue_size // workers, 1), overflow, key)
+                  for _ in range(workers)]
+
+    async def read():
+        try:
+            async for item in source:
+                if key is None:
+                    await queues[0].put(item)
+                else:
+                    await queues[hash(key(item)) % workers].put(item)
+        finally:
+            for queue in queues:
+                await queue.close()
+
+    async def work(queue):
+        while True:
+            item = await queue.get()
+            if item is _CLOSED:
+                return
+            await handler(item)
+
+    tasks = [asyncio.ensure_future(read())]
+    tasks += [asyncio.ensure_future(work(queues[i % len(queues)]))
+              for i in range(workers)]
+    try:
+        done, _ = await asyncio.wait(tasks,
+                                     return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Batcher:
+    """Groups items of an asynchronous iterator into lists.
+
+    A batch is delivered when it has `max_batch` items or when its first 
+    item is `max_latency` seconds old, whichever comes first. Items which 
+    were not delivered when iteration stopped, i.e. because the task was 
+    cancelled, can be collected with :meth:`take`.
+
+    Usage::
+
+        async with client.streaming("public") as stream:
+            async for batch in Batcher(stream, max_batch=500):
+                await db.insert_many([e.payload for e in batch])
+    """
+
+    def __init__(self, source, max_batch=100, max_latency=0.2):
+        self.source = source
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.batch = []
+
+    def take(self):
+        """Return undelivered items and start a new batch"""
+        batch, self.batch = self.batch, []
+        return batch
+
+    def __aiter__(self):
+        return self.batches()
+
+    async def batches(self):
+        loop = asyncio.get_event_loop()
+        source = self.source.__aiter__()
+        pending = None
+        deadline = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(source.__anext__())
+                timeout = max(deadline - loop.time(), 0) if self.batch \
+                        else None
+                done, _ = await asyncio.wait((pending,), timeout=timeout)
+                if done:
+                    task, pending = pending, None
+                    try:
+                        item = task.result()
+                    except StopAsyncIteration:
+                        break
+                    if not self.batch:
+                        deadline = loop.time() + self.max_latency
+                    self.batch.append(item)
+                    if len(self.batch) < self.max_batch:
+                        continue
+                if self.batch:
+                    yield self.take()
+            if self.batch:
+                yield self.take()
+        finally:
+            if pending is not None:
+                if pending.done():
+                    if not pending.cancelled() and \
+                            pending.exception() is None:
+                        self.batch.append(pending.result())
+                else:
+                    pending.cancel()
+                    with suppress(asyncio.CancelledError, 
+                                  StopAsyncIteration):
+                        await pending
@@ -0,0 +1,435 @@
+import asyncio
+import base64
+import gzip
+import json
+import re
+import time
+
+from collections import defaultdict, deque
+from urllib.parse import urlencode, parse_qsl
+
+import aiohttp
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from atoot.api import __useragent__
+
+_LINK_RE = re.compile(r'<([^>]*)>\s*;\s*rel="?([^",;]+)"?')
+# Query parameters left out of recordings
+_SECRET_PARAMS = frozenset(("access_token",))
+
+
+def request_key(method, url, params=None):
+    """Recording lookup key: method, path and query with sorted parameters,
+    without the host and the access token"""
+    if not url.startswith("/"):
+        start = url.find("/", url.find("//") + 2)
+        url = url[start:] if start != -1 else "/"
+    path, _, query = url.partition("?")
+    items = parse_qsl(query, keep_blank_values=True) if query else []
+    if params:
+        items.extend(params.items() if hasattr(params, "items") else params)
+    if items:
+        items = sorted((k, str(v)) for k, v in items
+                       if k not in _SECRET_PARAMS)
+        if items:
+            path += "?" + urlencode(items)
+    return method + " " + path
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _encode_body(body):
+    try:
+        return {"body": body.decode()}
+    except UnicodeDecodeError:
+        return {"body64": base64.b64encode(body).decode()}
+
+
+def _decode_body(record):
+    if "body64" in record:
+        return base64.b64decode(record["body64"])
+    return record.get("body", "").encode()
+
+
+class _RequestContext:
+    """Result of a session request method, awaitable and asynchronous
+    context manager like the one returned by aiohttp"""
+    __slots__ = ("_coro", "_response")
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._response = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        self._response = await self._coro
+        return await self._response.__aenter__()
+
+    async def __aexit__(self, *exc):
+        return await self._response.__aexit__(*exc)
+
+
+class _Content:
+    __slots__ = ("_response",)
+
+    def __init__(self, response):
+        self._response = response
+
+    async def iter_any(self):
+        async for chunk in self._response._iter_chunks():
+            yield chunk
+
+    async def read(self):
+        return await self._response.read()
+
+
+class ReplayResponse:
+    """Recorded HTTP response, with the subset of aiohttp.ClientResponse
+    used by the client"""
+    __slots__ = ("status", "reason", "headers", "links", "_body", "elapsed")
+
+    def __init__(self, record):
+        self.status = record["status"]
+        self.reason = record.get("reason", "")
+        self.headers = CIMultiDictProxy(CIMultiDict(record.get("headers", ())))
+        self.links = {}
+        for link in self.headers.getall("Link", ()):
+            for url, rel in _LINK_RE.findall(link):
+                self.links[rel] = {"url": URL(url), "rel": rel}
+        self._body = _decode_body(record)
+        self.elapsed = record.get("elapsed", 0.0)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    @property
+    def content(self):
+        return _Content(self)
+
+    async def _iter_chunks(self):
+        if self._body:
+            yield self._body
+
+    async def read(self):
+        return self._body
+
+    async def text(self):
+        return self._body.decode()
+
+    async def json(self, loads=json.loads, **kwargs):
+        return loads(self._body)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status,
+                                              message=self.reason)
+
+    def close(self):
+        pass
+
+    release = close
+
+
+class ReplayWebSocket:
+    """Recorded websocket connection, yields the recorded messages"""
+
+    def __init__(self, frames, speed=None):
+        self._frames = frames
+        self._speed = speed
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        started = time.monotonic()
+        for offset, msg_type, data in self._frames:
+            if self.closed:
+                return
+            if self._speed:
+                delay = started + offset / self._speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield aiohttp.WSMessage(msg_type, data, None)
+        self.closed = True
+
+    async def send_str(self, data):
+        pass
+
+    async def send_json(self, data):
+        pass
+
+    async def close(self):
+        self.closed = True
+        return True
+
+
+class ReplaySession:
+    """Transport replaying recorded traffic without network, used in place
+    of aiohttp.ClientSession.
+
+    Requests are matched by method, path and query parameters, the host and
+    the access token are ignored. Requests with the same key get their
+    recorded responses in order. Responses are parsed when the recording
+    is loaded, so replay costs a dict lookup per request.
+
+    :param path: recording file written by RecordingSession, gzip compressed if the name ends with .gz
+    :param speed: (optional) None to reply immediately, 1.0 to wait as long as the recorded requests took, 10.0 to run 10 times faster
+    :param loop: (optional) start over when the responses of a request are used up, instead of raising LookupError
+
+    Usage::
+
+    >>> c = await atoot.MastodonAPI.create("mastodon.social",
+    >>>         access_token=token, session=atoot.ReplaySession("traffic.jsonl.gz"))
+    >>> await c.home_timeline()
+    """
+
+    def __init__(self, path, speed=None, loop=True):
+        self.speed = speed
+        self.loop = loop
+        self.closed = False
+        self._responses = defaultdict(list)
+        self._websockets = defaultdict(list)
+        with _open(path, "r") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("kind") == "ws":
+                    self._websockets[record["key"]].append([
+                            (offset, aiohttp.WSMsgType(t), data 
+                             if t == aiohttp.WSMsgType.TEXT 
+                             else base64.b64decode(data))
+                            for offset, t, data in record["frames"]])
+                else:
+                    self._responses[record["key"]].append(
+                            ReplayResponse(record))
+        self._queues = {}
+        self._ws_queues = {}
+
+    @staticmethod
+    def _next(recorded, queues, key, loop):
+        queue = queues.get(key)
+        if not queue:
+            if key not in recorded or (key in queues and not loop):
+                raise LookupError("No recorded response for %s" % key)
+            queue = queues[key] = deque(recorded[key])
+        return queue.popleft()
+
+    async def _request(self, method, url, params=None, **kwargs):
+        response = self._next(self._responses, self._queues,
+                              request_key(method, url, params), self.loop)
+        if self.speed and response.elapsed:
+            await asyncio.sleep(response.elapsed / self.speed)
+        return response
+
+    def get(self, url, **kwargs):
+        return _RequestContext(self._request("GET", url, **kwargs))
+
+    def post(self, url, **kwargs):
+        return _RequestContext(self._request("POST", url, **kwargs))
+
+    def put(self, url, **kwargs):
+        return _RequestContext(self._request("PUT", url, **kwargs))
+
+    def patch(self, url, **kwargs):
+        return _RequestContext(self._request("PATCH", url, **kwargs))
+
+    def delete(self, url, **kwargs):
+        return _RequestContext(self._request("DELETE", url, **kwargs))
+
+    async def _ws_connect(self, url, **kwargs):
+        frames = self._next(self._websockets, self._ws_queues,
+                            request_key("GET", url), self.loop)
+        return ReplayWebSocket(frames, self.speed)
+
+    def ws_connect(self, url, **kwargs):
+        return _RequestContext(self._ws_connect(url, **kwargs))
+
+    async def close(self):
+        self.closed = True
+
+
+class _RecordingResponse:
+    """Proxy of aiohttp.ClientResponse, writes the response to the
+    recording when it is released"""
+
+    def __init__(self, recorder, key, response, started):
+        self._recorder = recorder
+        self._key = key
+        self._response = response
+        self._started = started
+        self._chunks = []
+        self._body = None
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.links = response.links
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    @property
+    def content(self):
+        return _Content(self)
+
+    async def _iter_chunks(self):
+        async for chunk in self._response.content.iter_any():
+            self._chunks.append(chunk)
+            yield chunk
+
+    async def read(self):
+        if self._body is None:
+            self._body = await self._response.read()
+        return self._body
+
+    async def text(self):
+        return (await self.read()).decode()
+
+    async def json(self, loads=json.loads, **kwargs):
+        return loads(await self.read())
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
+
+    def close(self):
+        if self._recorder is None:
+            return
+        body = self._body if self._body is not None else b"".join(self._chunks)
+        record = {"key": self._key, "status": self.status,
+                  "reason": self.reason,
+                  "headers": list(self.headers.items()),
+                  "elapsed": round(time.monotonic() - self._started, 6)}
+        record.update(_encode_body(body))
+        self._recorder.write(record)
+        self._recorder = None
+        self._response.release()
+
+    release = close
+
+
+class _RecordingWebSocket:
+    def __init__(self, recorder, key, ws):
+        self._recorder = recorder
+        self._key = key
+        self._ws = ws
+        self._frames = []
+        self._started = time.monotonic()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        async for msg in self._ws:
+            if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                data = msg.data if msg.type == aiohttp.WSMsgType.TEXT \
+                        else base64.b64encode(msg.data).decode()
+                self._frames.append((round(time.monotonic() - self._started,
+                                           6), int(msg.type), data))
+            yield msg
+
+    @property
+    def closed(self):
+        return self._ws.closed
+
+    async def send_str(self, data):
+        await self._ws.send_str(data)
+
+    async def send_json(self, data):
+        await self._ws.send_json(data)
+
+    async def close(self):
+        if self._recorder is not None:
+            self._recorder.write({"kind": "ws", "key": self._key,
+                                  "frames": self._frames})
+            self._recorder = None
+        return await self._ws.close()
+
+
+class RecordingSession:
+    """Transport recording request/response pairs and websocket messages
+    to a JSON lines file, for replay with ReplaySession. Used in place of
+    aiohttp.ClientSession.
+
+    Recorded responses include status, headers (with Link pagination and
+    rate limit headers), body and the time the request took. Access tokens
+    in query strings are left out, request headers aren't recorded.
+
+    :param path: recording file, gzip compressed if the name ends with .gz
+    :param session: (optional) aiohttp.ClientSession sending the requests
+
+    Usage::
+
+    >>> async with atoot.client("mastodon.social", access_token=token,
+    >>>         session=atoot.RecordingSession("traffic.jsonl.gz")) as c:
+    >>>     await c.get_all(c.account_followers(me))
+    """
+
+    def __init__(self, path, session=None):
+        self.session = session or aiohttp.ClientSession(
+                headers={"user-agent": __useragent__})
+        self._file = _open(path, "w")
+
+    @property
+    def closed(self):
+        return self.session.closed
+
+    def write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    async def _request(self, method, url, params=None, **kwargs):
+        started = time.monotonic()
+        response = await self.session.request(method, url, params=params,
+                                              **kwargs)
+        return _RecordingResponse(self, request_key(method, url, params),
+                                  response, started)
+
+    def get(self, url, **kwargs):
+        return _RequestContext(self._request("GET", url, **kwargs))
+
+    def post(self, url, **kwargs):
+        return _RequestContext(self._request("POST", url, **kwargs))
+
+    def put(self, url, **kwargs):
+        return _RequestContext(self._request("PUT", url, **kwargs))
+
+    def patch(self, url, **kwargs):
+        return _RequestContext(self._request("PATCH", url, **kwargs))
+
+    def delete(self, url, **kwargs):
+        return _RequestContext(self._request("DELETE", url, **kwargs))
+
+    async def _ws_connect(self, url, **kwargs):
+        ws = await self.session.ws_connect(url, **kwargs)
+        return _RecordingWebSocket(self, request_key("GET", url), ws)
+
+    def ws_connect(self, url, **kwargs):
+        return _RequestContext(self._ws_connect(url, **kwargs))
+
+    async def close(self):
+        self._file.close()
+        await self.session.close()
@@ -0,0 +1,194 @@
+"""Local fake Mastodon server for benchmarks.
+
+Serves realistic timeline, notification, follower and peer list payloads
+with Link and X-RateLimit-* headers, a streaming websocket and a media
+upload endpoint. Payloads are encoded once, so the server spends as little
+time as possible per request.
+"""
+import asyncio
+import json
+
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+PAGE_SIZE = 20
+
+
+def account(i):
+    return {
+        "id": str(100000 + i), "username": "user%d" % i,
+        "acct": "user%d@example.com" % i, "display_name": "User %d" % i,
+        "locked": False, "bot": i % 10 == 0, "discoverable": True,
+        "group": False, "created_at": "2020-01-01T00:00:00.000Z",
+        "note": "<p>Hello, I am user %d and I toot about things.</p>" % i,
+        "url": "https://example.com/@user%d" % i,
+        "avatar": "https://example.com/avatars/%d.png" % i,
+        "avatar_static": "https://example.com/avatars/%d.png" % i,
+        "header": "https://example.com/headers/%d.png" % i,
+        "header_static": "https://example.com/headers/%d.png" % i,
+        "followers_count": i * 7, "following_count": i * 3,
+        "statuses_count": i * 42, "last_status_at": "2020-07-04",
+        "emojis": [], "fields": [
+            {"name": "Website", "value": "https://example.com",
+             "verified_at": None}],
+    }
+
+
+def status(i):
+    return {
+        "id": str(1000000 - i), "uri": "https://example.com/statuses/%d" % i,
+        "created_at": "2020-07-04T12:00:00.608Z", "account": account(i % 50),
+        "content": "<p>" + "Status number %d with some text. " % i * 8 +
+                   "<a href=\"https://example.com/tags/bench\" "
+                   "class=\"mention hashtag\">#<span>bench</span></a></p>",
+        "visibility": "public", "sensitive": False, "spoiler_text": "",
+        "media_attachments": [{
+            "id": str(i), "type": "image",
+            "url": "https://example.com/media/%d.png" % i,
+            "preview_url": "https://example.com/media/%d_small.png" % i,
+            "remote_url": None, "text_url": None, "description": "Image",
+            "blurhash": "UeKUpFxuo~R%0nW;WCnhF6RjaJt757oJodS$",
+            "meta": {"original": {"width": 1200, "height": 800}}}]
+            if i % 4 == 0 else [],
+        "application": {"name": "atoot", "website": None},
+        "mentions": [], "tags": [{"name": "bench",
+                                  "url": "https://example.com/tags/bench"}],
+        "emojis": [], "reblogs_count": i % 7, "favourites_count": i % 13,
+        "replies_count": i % 3, "url": "https://example.com/@u/%d" % i,
+        "in_reply_to_id": None, "in_reply_to_account_id": None,
+        "reblog": None, "poll": None, "card": None, "language": "en",
+        "text": None, "favourited": False, "reblogged": False,
+        "muted": False, "bookmarked": False, "pinned": False,
+    }
+
+
+def notification(i):
+    return {"id": str(500000 - i), "type": "favourite",
+            "created_at": "2020-07-04T12:00:00.608Z",
+            "account": account(i % 50), "status": status(i)}
+
+
+class FakeServer:
+    """Fake Mastodon instance.
+
+    :param latency: (optional) seconds to wait before every reply
+    :param pages: (optional) number of pages of paginated endpoints
+    :param events: (optional) number of events sent to every stream
+    """
+
+    def __init__(self, latency=0.0, pages=10, events=1000):
+        self.latency = latency
+        self.pages = pages
+        self.events = events
+        self.requests = 0
+        self.runner = None
+        self.port = None
+
+        self.timeline = json.dumps(
+                [status(i) for i in range(PAGE_SIZE)]).encode()
+        self.notifications = json.dumps(
+                [notification(i) for i in range(PAGE_SIZE)]).encode()
+        self.followers = json.dumps(
+                [account(i) for i in range(40)]).encode()
+        self.peers = json.dumps(
+                ["instance%d.example.com" % i for i in range(5000)]).encode()
+        self.event = json.dumps({"event": "update", "stream": ["user"],
+                                 "payload": json.dumps(status(1))})
+        self.media = json.dumps({"id": "1", "type": "image",
+                                 "url": "https://example.com/media/1.png"})
+
+    @property
+    def instance(self):
+        return "127.0.0.1:%d" % self.port
+
+    def _headers(self, request, page=None):
+        reset = datetime.now(timezone.utc) + timedelta(minutes=5)
+        headers = {"Content-Type": "application/json",
+                   "X-RateLimit-Limit": "300",
+                   "X-RateLimit-Remaining": "299",
+                   "X-RateLimit-Reset": reset.isoformat()}
+        if page is not None:
+            links = []
+            if page + 1 < self.pages:
+                links.append('<%s?page=%d>; rel="next"' % (
+                        request.path, page + 1))
+            if page > 0:
+                links.append('<%s?page=%d>; rel="prev"' % (
+                        request.path, page - 1))
+            if links:
+                headers["Link"] = ", ".join(links)
+        return headers
+
+    async def _reply(self, request, body, paginated=False):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        page = int(request.query.get("page", 0)) if paginated else None
+        return web.Response(body=body, headers=self._headers(request, page))
+
+    async def home(self, request):
+        return await self._reply(request, self.timeline, True)
+
+    async def notifications_(self, request):
+        return await self._reply(request, self.notifications, True)
+
+    async def followers_(self, request):
+        return await self._reply(request, self.followers, True)
+
+    async def peers_(self, request):
+        return await self._reply(request, self.peers)
+
+    async def upload(self, request):
+        async for _ in request.content.iter_any():
+            pass
+        return await self._reply(request, self.media.encode())
+
+    async def streaming(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for _ in range(self.events):
+            await ws.send_str(self.event)
+        await ws.close()
+        return ws
+
+    def app(self):
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_get("/api/v1/timelines/home", self.home)
+        app.router.add_get("/api/v1/notifications", self.notifications_)
+        app.router.add_get("/api/v1/accounts/{id}/followers", self.followers_)
+        app.router.add_get("/api/v1/instance/peers", self.peers_)
+        app.router.add_post("/api/v1/media", self.upload)
+        app.router.add_get("/api/v1/streaming/", self.streaming)
+        return app
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def serve(latency, pages, events):
+    server = FakeServer(latency, pages, events)
+    await server.start()
+    print(server.port, flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="reply delay in milliseconds")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.latency / 1000, args.pages, args.events))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,71 @@
+"""Per-request overhead of the client, measured against a local server.
+
+Usage::
+
+    python benchmarks/request_overhead.py [-n 5000] [-c 50]
+
+The script times the atoot package of the checkout it is in. To get the
+"before" number of a change, run it on a checkout of the earlier
+revision, i.e. the commit before the change::
+
+    git worktree add ../atoot-before <revision>
+    mkdir -p ../atoot-before/benchmarks
+    cp benchmarks/request_overhead.py ../atoot-before/benchmarks/
+    python ../atoot-before/benchmarks/request_overhead.py
+
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import atoot  # noqa: E402
+
+
+async def timeline(request):
+    return web.json_response([])
+
+
+async def run(n, concurrency):
+    app = web.Application()
+    app.router.add_get("/api/v1/bookmarks", timeline)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    async with atoot.client("127.0.0.1:%d" % port, access_token="token",
+                            use_https=False) as c:
+        await c.bookmarks(limit=20)
+
+        start = time.perf_counter()
+        for _ in range(n):
+            await c.bookmarks(limit=20)
+        sequential = time.perf_counter() - start
+
+        async def worker(count):
+            for _ in range(count):
+                await c.bookmarks(limit=20)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n // concurrency) 
+                               for _ in range(concurrency)))
+        concurrent = time.perf_counter() - start
+
+    await runner.cleanup()
+    print("sequential: %.1f us/request" % (sequential / n * 1e6))
+    print("concurrent (%d): %.1f us/request" % (
+            concurrency, concurrent / (n // concurrency * concurrency) * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=5000)
+    parser.add_argument("-c", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.n, args.c))
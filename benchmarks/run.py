@@ -0,0 +1,251 @@
+"""Client benchmark suite against the local fake Mastodon server.
+
+Measures requests/sec, p50/p99 latency, memory allocated per request and
+peak memory for plain GET requests, pagination, streaming fan-in and media
+upload. The fake server runs in a separate process, so its work isn't
+counted.
+
+Usage::
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json
+
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import atoot  # noqa: E402
+from atoot import codec  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def version():
+    """Release of the measured atoot, from the setup.py of the checkout or
+    the installed package metadata"""
+    try:
+        with open(os.path.join(ROOT, "setup.py")) as f:
+            match = re.search(r'__version__ = "([^"]+)"', f.read())
+        if match:
+            return match.group(1)
+    except OSError:
+        pass
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        return version("atoot")
+    except (ImportError, PackageNotFoundError):
+        return None
+
+
+def revision():
+    """Git revision of the checkout, with a -dirty suffix for uncommitted
+    changes, None outside a git repository"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"],
+                cwd=ROOT, capture_output=True, text=True,
+                check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def timed(func, n, concurrency):
+    """Run func n times with `concurrency` callers, return (seconds, list
+    of latencies)"""
+    latencies = []
+    queue = iter(range(n))
+
+    async def caller():
+        for _ in queue:
+            start = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def memory(func, n, concurrency):
+    """Memory used by the client per operation (highest traced memory
+    during the operation minus memory before it) and peak memory in bytes,
+    measured with tracemalloc, operations run one at a time"""
+    tracemalloc.start()
+    try:
+        await timed(func, max(n // 10, 1), concurrency)
+        before, _ = tracemalloc.get_traced_memory()
+        allocated = highest = 0
+        for _ in range(max(n // 10, 1)):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            await func()
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - start
+            highest = max(highest, peak)
+        return allocated / max(n // 10, 1), highest - before
+    finally:
+        tracemalloc.stop()
+
+
+async def bench(name, func, n, concurrency, units=1):
+    """Measure func, `units` is the number of requests (or events) done by
+    one call"""
+    await func()  # warm up connections
+    seconds, latencies = await timed(func, n, concurrency)
+    per_op, peak = await memory(func, n, concurrency)
+    result = {
+        "ops": n, "concurrency": concurrency, "seconds": seconds,
+        "ops_per_sec": n / seconds,
+        "requests_per_sec": n * units / seconds,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "alloc_kib_per_op": per_op / 1024,
+        "peak_kib": peak / 1024,
+    }
+    print("%-14s %9.1f req/s  p50 %7.2f ms  p99 %7.2f ms  %8.1f KiB/op  "
+          "peak %8.1f KiB" % (name, result["requests_per_sec"],
+          result["p50_ms"], result["p99_ms"], result["alloc_kib_per_op"],
+          result["peak_kib"]), file=sys.stderr)
+    return result
+
+
+async def run(args):
+    server = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(HERE, "fake_server.py"),
+            "--latency", str(args.latency), "--pages", str(args.pages),
+            "--events", str(args.events), stdout=asyncio.subprocess.PIPE)
+    port = int(await server.stdout.readline())
+    instance = "127.0.0.1:%d" % port
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    session = aiohttp.ClientSession(connector=connector)
+    results = {}
+    try:
+        c = await atoot.MastodonAPI.create(instance, access_token="bench",
+                use_https=False, session=session, model=args.model)
+        n, conc = args.requests, args.concurrency
+
+        results["get"] = await bench("get", c.home_timeline, n, conc)
+        results["get_large"] = await bench("get_large", c.instance_peers,
+                                           max(n // 10, 1), conc)
+
+        async def get_all():
+            await c.get_all(c.account_followers("1"))
+        results["get_all"] = await bench("get_all", get_all, 
+                max(n // args.pages, 1), conc, units=args.pages)
+
+        async def get_next():
+            page = await c.get_notifications()
+            while page.next:
+                page = await c.get_next(page)
+        results["get_next"] = await bench("get_next", get_next, 
+                max(n // args.pages, 1), conc, units=args.pages)
+
+        async def stream():
+            async def consume():
+                async with c.streaming("user", transport="websocket") as s:
+                    async for event in s:
+                        event.payload
+            await asyncio.gather(*(consume() for _ in range(args.streams)))
+        results["streaming"] = await bench("streaming", stream, 
+                max(args.requests // 500, 2), 1, 
+                units=args.events * args.streams)
+
+        media = memoryview(bytes(args.media_size))
+        async def upload():
+            await c.upload_attachment(media, filename="bench.png")
+        results["upload"] = await bench("upload", upload, 
+                max(n // 50, 2), min(conc, 4))
+        results["upload"]["mib_per_sec"] = \
+                results["upload"]["ops_per_sec"] * args.media_size / 2 ** 20
+    finally:
+        await session.close()
+        server.terminate()
+        await server.wait()
+
+    return {
+        "atoot": version(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "aiohttp": aiohttp.__version__,
+        "json": codec.loads.__module__,
+        "params": vars(args),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Print relative change against a baseline report, return number of
+    regressions larger than threshold"""
+    regressions = 0
+    print("%s (%s) -> %s (%s)" % (baseline.get("atoot"),
+          baseline.get("revision"), report["atoot"], report["revision"]),
+          file=sys.stderr)
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        for key, higher_is_better in (("requests_per_sec", True),
+                ("p99_ms", False), ("alloc_kib_per_op", False)):
+            change = result[key] / old[key] - 1 if old[key] else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("%-14s %-18s %+7.1f%%%s" % (name, key, change * 100, flag),
+                  file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="server reply delay in milliseconds")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--events", type=int, default=1000,
+                        help="events sent to every stream")
+    parser.add_argument("--streams", type=int, default=4,
+                        help="concurrent streams for the fan-in benchmark")
+    parser.add_argument("--media-size", type=int, default=4 * 2 ** 20)
+    parser.add_argument("--model", action="store_true",
+                        help="return typed entities instead of dicts")
+    parser.add_argument("-o", "--output", help="write JSON report to a file")
+    parser.add_argument("--compare", help="baseline JSON report")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import atoot
+from aiohttp import web
+from atoot.streaming import Batcher
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def source(items, delay=0, stall=False):
+    for i in items:
+        await asyncio.sleep(delay)
+        yield i
+    if stall:
+        await asyncio.sleep(3600)
+
+async def test_flush_on_size_and_end(loop):
+    batches = [b async for b in Batcher(source(range(7)), max_batch=3)]
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+async def test_flush_on_latency(loop):
+    batches = []
+    batcher = Batcher(source(range(3), stall=True), max_batch=10, 
+                      max_latency=0.02)
+    async for batch in batcher:
+        batches.append(batch)
+        break
+    assert batches == [[0, 1, 2]]
+
+async def test_undelivered_items_after_cancel(loop):
+    batcher = Batcher(source(range(3), stall=True), max_batch=10, 
+                      max_latency=60)
+
+    async def consume():
+        async for batch in batcher:
+            pass
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert batcher.take() == [0, 1, 2]
+
+async def slow_events(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    for i in range(6):
+        await ws.send_str(json.dumps({"event": "delete", "payload": str(i)}))
+        await asyncio.sleep(0.01)
+    async for msg in ws:
+        pass
+    return ws
+
+async def test_batch_handler_cancelled_in_handler(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', slow_events)
+    cli = await aiohttp_client(app)
+    delivered = []
+
+    async def handler(client, events):
+        delivered.extend(int(e.payload) for e in events)
+        if len(delivered) == len(events):
+            await asyncio.sleep(3600)
+
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        task = asyncio.ensure_future(c.streaming_batch_handler("user", 
+                handler, max_batch=1000, max_latency=0.005, 
+                transport="websocket"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    # the event read while the handler was busy is delivered too
+    assert len(delivered) >= 2
+    assert delivered == list(range(len(delivered)))
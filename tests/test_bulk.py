@@ -0,0 +1,80 @@
+import asyncio
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def follow(request):
+    app = request.app
+    app["running"] += 1
+    app["max_running"] = max(app["max_running"], app["running"])
+    await asyncio.sleep(0.01)
+    app["running"] -= 1
+    if request.match_info["id"] == "3":
+        return web.json_response({"error": "Record not found"}, status=404)
+    return web.json_response({"id": request.match_info["id"], 
+                              "following": True})
+
+async def relationships(request):
+    return web.json_response([{"id": i} for i in request.query.getall("id")])
+
+async def test_bulk(aiohttp_client, loop):
+    app = web.Application()
+    app["running"] = app["max_running"] = 0
+    app.router.add_route('POST', '/api/v1/accounts/{id}/follow', follow)
+    app.router.add_route('GET', '/api/v1/accounts/relationships', 
+                         relationships)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        results = [r async for r in c.bulk("account_follow", 
+            [str(i) for i in range(10)], concurrency=3, skip={"5"})]
+        assert app["max_running"] == 3
+        assert sorted(r.index for r in results if r.ok) == \
+                [0, 1, 2, 4, 6, 7, 8, 9]
+        failed = [r for r in results if not r.ok]
+        assert [r.item for r in failed] == ["3"]
+        assert isinstance(failed[0].error, atoot.NotFoundError)
+
+        ids = [str(i) for i in range(100)]
+        results = [r async for r in c.bulk(c.account_relationships, ids)]
+        assert sorted(len(r.item) for r in results) == [20, 40, 40]
+        assert [a["id"] for r in sorted(results) for a in r.result] == ids
+
+async def list_accounts(request):
+    request.app["chunks"].append(len((await request.json())["account_ids"]))
+    return web.json_response({})
+
+async def test_chunked_array_endpoints(aiohttp_client, loop):
+    app = web.Application()
+    app["chunks"] = []
+    app.router.add_route('GET', '/api/v1/accounts/relationships', 
+                         relationships)
+    app.router.add_route('POST', '/api/v1/lists/{id}/accounts', list_accounts)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli, 
+            chunk_sizes={"list_accounts_add": 25}) as c:
+        c.base_url = ""
+        ids = [str(i) for i in range(90)]
+        relationships_ = await c.account_relationships(ids)
+        assert [r["id"] for r in relationships_] == ids
+        assert await c.list_accounts_add("1", ids[:60]) == {}
+        assert sorted(app["chunks"]) == [10, 25, 25]
+
+async def test_bulk_break_cancels_calls(loop):
+    from atoot.bulk import bulk
+    cancelled = []
+
+    async def call(item):
+        try:
+            await asyncio.sleep(item)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+        return item
+
+    results = bulk(call, [0, 10, 10], concurrency=3)
+    async for r in results:
+        break
+    await results.aclose()
+    # the pending calls are finished when the iterator is closed
+    assert sorted(cancelled) == [10, 10]
@@ -0,0 +1,99 @@
+import asyncio
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def show_list(request):
+    request.app["calls"] += 1
+    title = request.app["title"]
+    if "gate" in request.app:
+        await request.app["gate"].wait()
+    return web.json_response({"id": request.match_info["id"], 
+                              "title": title})
+
+async def update_list(request):
+    request.app["title"] = (await request.post())["title"]
+    return web.json_response({})
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["calls"] = 0
+    app["title"] = "old"
+    app.router.add_route('GET', '/api/v1/lists/{id}', show_list)
+    app.router.add_route('PUT', '/api/v1/lists/{id}', update_list)
+    return app
+
+async def test_cache_and_invalidate(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, cache=True) as c:
+        c.base_url = ""
+        assert (await c.show_list(1))["title"] == "old"
+        assert (await c.show_list(1))["title"] == "old"
+        assert cli.server.app["calls"] == 1
+        assert (c.cache.hits, c.cache.misses) == (1, 1)
+
+        await c.update_list(1, "new")
+        assert (await c.show_list(1))["title"] == "new"
+        assert cli.server.app["calls"] == 2
+
+def test_lru_eviction():
+    cache = atoot.ResponseCache(maxsize=2)
+    for i in range(3):
+        cache.set(("/api/v1/lists/%d" % i,), "/api/v1/lists/%d" % i, i, 60)
+    assert cache.get(("/api/v1/lists/0",)) is None
+    assert cache.evictions == 1
+    cache.invalidate("/api/v1/lists")
+    assert len(cache) == 0
+
+def test_invalidation_rules():
+    cache = atoot.ResponseCache()
+    assert cache.ttl_for("/api/v1/accounts/1/") == 300
+    assert cache.ttl_for("/api/v1/accounts/relationships") is None
+    assert cache.ttl_for("/api/v1/timelines/home") is None
+    cache.set("me", "/api/v1/accounts/verify_credentials", {}, 60)
+    cache.invalidate("/api/v1/accounts/update_credentials")
+    assert len(cache) == 0
+
+async def test_cache_instance(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    cache = atoot.ResponseCache(256)
+    async with atoot.client("test", session=cli, cache=cache) as c:
+        c.base_url = ""
+        assert c.cache is cache
+        await c.show_list(1)
+        await c.show_list(1)
+        assert cli.server.app["calls"] == 1 and len(cache) == 1
+
+async def test_write_during_get(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    gate = cli.server.app["gate"] = asyncio.Event()
+    async with atoot.client("test", session=cli, cache=True) as c:
+        c.base_url = ""
+        stale = asyncio.ensure_future(c.show_list(1))
+        while not cli.server.app["calls"]:
+            await asyncio.sleep(0.01)
+        await c.update_list(1, "new")
+        gate.set()
+        # response from before the update isn't cached
+        assert (await stale)["title"] == "old"
+        assert len(c.cache) == 0
+        assert (await c.show_list(1))["title"] == "new"
+
+def test_generation():
+    cache = atoot.ResponseCache()
+    generation = cache.generation("/api/v1/lists/1")
+    cache.invalidate("/api/v1/accounts/1")
+    assert cache.generation("/api/v1/lists/1") == generation
+    for path in ("/api/v1/lists", "/api/v1/lists/1/accounts",
+                 "/api/v1/lists/1"):
+        cache.invalidate(path)
+        assert cache.generation("/api/v1/lists/1") != generation
+        generation = cache.generation("/api/v1/lists/1")
+
+def test_forgotten_generation():
+    cache = atoot.ResponseCache(maxsize=1)
+    generation = cache.generation("/api/v1/lists/1")
+    cache.invalidate("/api/v1/lists/1")
+    for i in range(10):
+        cache.invalidate("/api/v1/accounts/%d" % i)
+    assert cache.generation("/api/v1/lists/1") != generation
@@ -0,0 +1,28 @@
+import asyncio
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def instance(request):
+    request.app["calls"] += 1
+    await asyncio.sleep(0.05)
+    return web.json_response({"uri": "test"})
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["calls"] = 0
+    app.router.add_route('GET', '/api/v1/instance', instance)
+    app.router.add_route('GET', '/api/v1/accounts/{id}/', instance)
+    return app
+
+async def test_coalesce_identical_requests(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, coalesce=True) as c:
+        c.base_url = ""
+        results = await asyncio.gather(*[c.get_instance() for _ in range(10)])
+        assert all(r is results[0] for r in results)
+        assert cli.server.app["calls"] == 1
+
+        await asyncio.gather(c.account(1), c.account(2), c.account(1))
+        assert cli.server.app["calls"] == 3
+        assert c._inflight == {}
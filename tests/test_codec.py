@@ -0,0 +1,27 @@
+import json
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def markers(request):
+    assert request.content_type == "application/json"
+    return web.json_response(await request.json())
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app.router.add_route('POST', '/api/v1/markers', markers)
+    return app
+
+async def test_custom_codec(aiohttp_client, loop):
+    calls = []
+    def loads(body):
+        calls.append(type(body))
+        return json.loads(body)
+
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, json_loads=loads, 
+                            json_dumps=json.dumps) as c:
+        c.base_url = ""
+        params = {"home": {"last_read_id": "1"}}
+        assert await c.markers_set(params) == params
+        assert calls == [bytes]
@@ -0,0 +1,36 @@
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def peers(request):
+    if request.headers.get("If-None-Match") == '"v1"':
+        return web.Response(status=304)
+    request.app["bodies"] += 1
+    return web.json_response(["a.example", "b.example"], 
+                             headers={"ETag": '"v1"'})
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["bodies"] = 0
+    app.router.add_route('GET', '/api/v1/instance/peers', peers)
+    return app
+
+async def test_etag_revalidation(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, conditional=True) as c:
+        c.base_url = ""
+        first = await c.instance_peers()
+        second = await c.instance_peers()
+        assert second is first
+        assert cli.server.app["bodies"] == 1
+        assert c.validators.revalidated == 1
+
+async def test_validator_store_instance(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    store = atoot.ValidatorStore(16)
+    async with atoot.client("test", session=cli, conditional=store) as c:
+        c.base_url = ""
+        assert c.validators is store
+        await c.instance_peers()
+        await c.instance_peers()
+        assert len(store) == 1 and store.revalidated == 1
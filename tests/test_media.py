@@ -0,0 +1,82 @@
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+DATA = bytes(range(256)) * 4000
+
+async def media(request):
+    request.app["lengths"].append(request.content_length)
+    if len(request.app["lengths"]) == 1:
+        await request.read()
+        return web.Response(status=429, headers={"Retry-After": "0"})
+    form = await request.post()
+    assert form["file"].file.read() == DATA
+    return web.json_response({"id": "1", "description": form["description"],
+                              "filename": form["file"].filename, 
+                              "content_type": form["file"].content_type})
+
+async def test_streaming_upload(aiohttp_client, loop, tmp_path):
+    app = web.Application()
+    app["lengths"] = []
+    app.router.add_route('POST', '/api/v1/media', media)
+    cli = await aiohttp_client(app)
+    path = tmp_path / "video.mp4"
+    path.write_bytes(DATA)
+    async with atoot.client("test", access_token="test", session=cli, 
+            retry=atoot.RetryPolicy(backoff=0)) as c:
+        c.base_url = ""
+        sent = []
+        r = await c.upload_attachment(str(path), description="a video", 
+                progress=lambda n, total: sent.append((n, total)))
+        assert r["filename"] == "video.mp4" and r["description"] == "a video"
+        assert r["content_type"] == "video/mp4"
+        assert sent[-1] == (len(DATA), len(DATA))
+        assert app["lengths"][0] == app["lengths"][1] > len(DATA)
+
+        r = await c.upload_attachment(memoryview(DATA), filename="a.png", 
+                                      description="x")
+        assert r["content_type"] == "image/png"
+
+        async def chunks():
+            for i in range(0, len(DATA), 10000):
+                yield DATA[i:i + 10000]
+        r = await c.upload_attachment(chunks(), size=len(DATA), 
+                                      description="x")
+        assert r["filename"] == "file"
+        assert app["lengths"][-1] is not None
+
+async def media_v2(request):
+    form = await request.post()
+    _id = str(len(request.app["media"]) + 1)
+    request.app["media"][_id] = 0
+    return web.json_response({"id": _id, "url": None, 
+                              "description": form.get("description")}, status=202)
+
+async def view_media(request):
+    _id = request.match_info["id"]
+    request.app["media"][_id] += 1
+    if request.app["media"][_id] < int(_id):
+        return web.json_response({"id": _id, "url": None}, status=206)
+    return web.json_response({"id": _id, "url": "/%s.png" % _id})
+
+async def statuses(request):
+    return web.json_response({"id": "9", 
+                              "media_ids": (await request.json())["media_ids"]})
+
+async def test_create_status_with_media(aiohttp_client, loop):
+    app = web.Application()
+    app["media"] = {}
+    app.router.add_route('POST', '/api/v2/media', media_v2)
+    app.router.add_route('GET', '/api/v1/media/{id}', view_media)
+    app.router.add_route('POST', '/api/v1/statuses', statuses)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        a = await c.upload_media(DATA, filename="a.png", description="a")
+        assert a["url"] is None and a["description"] == "a"
+        assert (await c.wait_for_media(a, interval=0.01))["url"] == "/1.png"
+
+        status = await c.create_status_with_media(
+                [(DATA, "b"), (DATA, "c"), DATA], status="hi")
+        assert status["media_ids"] == ["2", "3", "4"]
+        assert app["media"] == {"1": 1, "2": 2, "3": 3, "4": 4}
@@ -0,0 +1,76 @@
+import atoot
+from aiohttp import web
+from atoot.metrics import endpoint_template
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+def test_endpoint_template():
+    assert endpoint_template("/api/v1/statuses/103704874/favourite") == \
+            "/api/v1/statuses/:id/favourite"
+    assert endpoint_template("/api/v1/accounts/1/?x=1") == \
+            "/api/v1/accounts/:id"
+    assert endpoint_template("/api/v1/timelines/tag/cats?local=true") == \
+            "/api/v1/timelines/tag/:name"
+
+async def status(request):
+    if request.match_info["id"] == "2":
+        return web.json_response({"error": "Record not found"}, status=404)
+    return web.json_response({"id": request.match_info["id"]}, 
+                             headers={"X-RateLimit-Remaining": "299"})
+
+async def test_metrics(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/statuses/{id}/', status)
+    cli = await aiohttp_client(app)
+    samples = []
+    metrics = atoot.Metrics(hooks=[samples.append])
+    async with atoot.client("test", access_token="test", session=cli, 
+                            metrics=metrics) as c:
+        c.base_url = ""
+        await c.view_status("1")
+        await c.view_status("3")
+        try:
+            await c.view_status("2")
+        except atoot.NotFoundError:
+            pass
+    stats = metrics.stats()["GET /api/v1/statuses/:id"]
+    assert stats["count"] == 3 and stats["errors"] == 1
+    assert stats["statuses"] == {200: 2, 404: 1}
+    assert stats["bytes"] == 2 * len(b'{"id": "1"}')
+    assert stats["ratelimit_remaining"] == 299
+    assert stats["p50"] > 0 and stats["max_time"] >= stats["avg_time"]
+    assert [s.status for s in samples] == [200, 200, 404]
+    assert samples[0].decode is not None
+
+async def test_metrics_trace_config(aiohttp_server, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/statuses/{id}/', status)
+    server = await aiohttp_server(app)
+    samples = []
+    async with atoot.client("%s:%d" % (server.host, server.port), 
+            use_https=False, metrics=atoot.Metrics([samples.append])) as c:
+        await c.view_status("1")
+        await c.view_status("1")
+    assert samples[0].connect is not None and samples[1].connect is None
+    assert 0 < samples[0].ttfb <= samples[0].elapsed
+
+async def test_metrics_hook_error(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/statuses/{id}/', status)
+    cli = await aiohttp_client(app)
+    samples = []
+
+    def broken(sample):
+        raise RuntimeError("exporter is down")
+
+    metrics = atoot.Metrics(hooks=[broken, samples.append])
+    async with atoot.client("test", access_token="test", session=cli, 
+                            metrics=metrics) as c:
+        c.base_url = ""
+        assert (await c.view_status("1"))["id"] == "1"
+        try:
+            await c.view_status("2")
+        except atoot.NotFoundError:
+            pass
+    assert metrics.hook_errors == 2
+    assert isinstance(metrics.last_hook_error, RuntimeError)
+    assert [s.status for s in samples] == [200, 404]
@@ -0,0 +1,48 @@
+import atoot
+from atoot.models import Status, Notification, Account
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+STATUS = {"id": "1", "content": "hi", "new_field": 1,
+          "account": {"id": "2", "acct": "bob"},
+          "media_attachments": [{"id": "3", "type": "image"}],
+          "reblog": None}
+
+def test_status_model():
+    s = Status(STATUS)
+    assert not hasattr(s, "__dict__")
+    assert s.id == "1" and s["content"] == "hi"
+    assert s["new_field"] == 1 and "new_field" in s
+    assert type(s._account) is dict
+    assert isinstance(s.account, Account) and s.account.acct == "bob"
+    assert s.media_attachments[0].type == "image"
+    assert s.get("missing") is None
+    assert s == Status(STATUS)
+    assert s.to_dict()["account"]["acct"] == "bob"
+
+def test_absent_fields():
+    s = Status(STATUS)
+    assert s.poll is None and "poll" not in s and s.get("poll", 1) == 1
+    assert "reblog" in s and s["reblog"] is None
+    assert s == STATUS and s.to_dict() == STATUS
+    assert sorted(s.keys()) == sorted(STATUS) and len(s) == len(STATUS)
+    assert s.account == STATUS["account"]
+    assert s != Status(dict(STATUS, poll=None))
+
+async def notifications(request):
+    return web.json_response([{"id": "5", "type": "mention", 
+                               "status": STATUS, "account": STATUS["account"]}])
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app.router.add_route('GET', '/api/v1/notifications', notifications)
+    return app
+
+async def test_client_models(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, model=True) as c:
+        c.base_url = ""
+        notifs = await c.get_notifications()
+        assert isinstance(notifs[0], Notification)
+        assert notifs[0].status.account.id == "2"
+        assert atoot.api.get_id(notifs[0]) == "5"
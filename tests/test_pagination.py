@@ -0,0 +1,88 @@
+import json
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+PAGES = [[{"id": str(i)} for i in range(p * 3, p * 3 + 3)] for p in range(4)]
+
+async def followers(request):
+    page = int(request.query.get("page", 0))
+    headers = {}
+    if page + 1 < len(PAGES):
+        headers["Link"] = '<http://localhost/api/v1/accounts/1/followers?page=%d>; rel="next"' % (page + 1)
+    request.app["requests"] += 1
+    return web.json_response(PAGES[page], headers=headers)
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["requests"] = 0
+    app.router.add_route('GET', '/api/v1/accounts/1/followers', followers)
+    return app
+
+async def test_paginate_items(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        ids = [a["id"] async for a in c.paginate(c.account_followers(1))]
+        assert ids == [str(i) for i in range(12)]
+
+async def test_paginate_stop_conditions(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        ids = [a["id"] async for a in 
+               c.paginate(c.account_followers(1), max_items=4)]
+        assert ids == ["0", "1", "2", "3"]
+        assert cli.server.app["requests"] == 2
+
+        ids = [a["id"] async for a in 
+               c.paginate(c.account_followers(1), until_id="7")]
+        assert ids == [str(i) for i in range(7)]
+
+        pages = [p async for p in 
+                 c.paginate(c.account_followers(1), max_pages=2, pages=True)]
+        assert [len(p) for p in pages] == [3, 3]
+
+async def test_get_all(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        assert len(await c.get_all(c.account_followers(1))) == 12
+        assert len(await c.get_n_pages(c.account_followers(1), n=2)) == 6
+
+async def test_max_pages_zero(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        items = await c.get_n_pages(c.account_followers(1), n=0)
+        assert [a["id"] for a in items] == ["0", "1", "2"]
+        pages = [p async for p in c.paginate(c.account_followers(1),
+                                              max_pages=0, prefetch=1,
+                                              pages=True)]
+        assert len(pages) == 1 and len(pages[0]) == 3
+        assert cli.server.app["requests"] == 2
+
+async def test_paginate_prefetch(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        ids = [a["id"] async for a in 
+               c.paginate(c.account_followers(1), prefetch=2)]
+        assert ids == [str(i) for i in range(12)]
+
+        ids = [a["id"] async for a in 
+               c.paginate(c.account_followers(1), prefetch=1, max_pages=2)]
+        assert ids == [str(i) for i in range(6)]
+
+async def test_resume_from_cursor(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        page = await c.account_followers(1)
+        assert not hasattr(page, "kwargs")
+        saved = json.dumps(page.cursor.to_dict())
+
+        cursor = atoot.PageCursor.from_dict(json.loads(saved))
+        ids = [a["id"] async for a in c.paginate(cursor)]
+        assert ids == [str(i) for i in range(3, 12)]
+        assert (await c.get_next(cursor)).cursor.template == cursor.template
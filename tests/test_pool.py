@@ -0,0 +1,45 @@
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def verify_credentials(request):
+    token = request.headers["Authorization"].split()[1]
+    return web.json_response({"id": token}, headers={
+        "X-RateLimit-Limit": "300", "X-RateLimit-Remaining": token})
+
+async def test_client_pool(aiohttp_server, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/accounts/verify_credentials', 
+                         verify_credentials)
+    server = await aiohttp_server(app)
+    instance = "%s:%d" % (server.host, server.port)
+    async with atoot.ClientPool(limit_per_host=2, use_https=False, 
+                                ratelimit=True) as pool:
+        a = await pool.client(instance, access_token="10")
+        b = await pool.client(instance, access_token="20")
+        assert a is await pool.client(instance, access_token="10")
+        assert a.session is b.session
+        assert a.ratelimiter is not b.ratelimiter
+
+        assert (await a.verify_account_credentials())["id"] == "10"
+        assert (await b.verify_account_credentials())["id"] == "20"
+        assert a.ratelimit_remaining == "10" and b.ratelimit_remaining == "20"
+        assert pool.stats() == {server.host: {"active": 0, "idle": 1}}
+
+        await a.close()
+        assert len(pool) == 1 and not b.session.closed
+    assert b.session.closed
+
+async def test_client_pool_metrics(aiohttp_server, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/accounts/verify_credentials', 
+                         verify_credentials)
+    server = await aiohttp_server(app)
+    instance = "%s:%d" % (server.host, server.port)
+    metrics = atoot.Metrics()
+    async with atoot.ClientPool(use_https=False, metrics=metrics) as pool:
+        a = await pool.client(instance, access_token="10")
+        assert len(a.session.trace_configs) == 1
+        await a.verify_account_credentials()
+        stats = metrics.stats()["GET /api/v1/accounts/verify_credentials"]
+        assert stats["count"] == 1 and stats["avg_connect"] > 0
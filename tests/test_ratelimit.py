@@ -0,0 +1,47 @@
+import atoot
+from aiohttp import web
+from atoot.ratelimit import seconds_until_reset
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+def test_seconds_until_reset_uses_server_clock():
+    assert seconds_until_reset("2020-07-04T12:05:00.000Z", 
+                               "Sat, 04 Jul 2020 12:00:00 GMT") == 300
+    assert seconds_until_reset("garbage") is None
+
+def test_buckets():
+    limiter = atoot.RateLimiter(limit=10, period=10)
+    assert limiter.bucket_for("POST", "/api/v1/media") is \
+            limiter.buckets["media"]
+    assert limiter.bucket_for("DELETE", "/api/v1/statuses/1") is \
+            limiter.buckets["status_delete"]
+    assert limiter.bucket_for("GET", "/api/v1/statuses/1") is None
+
+    delays = [limiter.default.reserve() for _ in range(12)]
+    assert delays[:10] == [0] * 10
+    assert 0.9 < delays[10] < 1.1 and 1.9 < delays[11] < 2.1
+
+def test_exhausted_bucket_blocks_until_reset():
+    limiter = atoot.RateLimiter()
+    limiter.update("GET", "/api/v1/timelines/home", {
+        "X-RateLimit-Limit": "300", "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset": "2020-07-04T12:00:30.000Z",
+        "Date": "Sat, 04 Jul 2020 12:00:00 GMT"})
+    assert 29 < limiter.default.reserve() <= 30
+
+async def ratelimited(request):
+    return web.json_response({}, headers={
+        "X-RateLimit-Limit": "300", "X-RateLimit-Remaining": "299"})
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app.router.add_route('GET', '/api/v1/accounts/verify_credentials', 
+                         ratelimited)
+    return app
+
+async def test_client_updates_limiter(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli,
+                            ratelimit=True) as c:
+        c.base_url = ""
+        await c.verify_account_credentials()
+        assert c.ratelimiter.default.tokens <= 299
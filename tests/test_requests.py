@@ -0,0 +1,27 @@
+import asyncio
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def bookmarks(request):
+    await asyncio.sleep(0.01)
+    assert request.headers["Authorization"] == "Bearer test"
+    return web.json_response(dict(request.query))
+
+async def test_isolated_requests(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/bookmarks', bookmarks)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        params = {"max_id": "9"}
+        headers = {"Accept-Language": "en"}
+        results = await asyncio.gather(
+                c.bookmarks(limit=5), c.bookmarks(),
+                c.bookmarks(params=params, limit=1),
+                c.get('/api/v1/bookmarks', headers=headers))
+        assert [dict(r) for r in results] == [
+                {"limit": "5"}, {}, {"max_id": "9", "limit": "1"}, {}]
+        assert params == {"max_id": "9"}
+        assert headers == {"Accept-Language": "en"}
+        assert c._auth_headers == {"Authorization": "Bearer test"}
@@ -0,0 +1,56 @@
+import pytest
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+def flaky(status, failures=2, headers=None):
+    async def handler(request):
+        request.app["calls"] += 1
+        if request.app["calls"] <= failures:
+            return web.json_response({"error": "try again"}, status=status,
+                                     headers=headers)
+        return web.json_response({"id": "1"})
+    return handler
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["calls"] = 0
+    app.router.add_route('GET', '/api/v1/instance', flaky(503))
+    app.router.add_route('POST', '/api/v1/follow_requests/1/authorize', 
+                         flaky(503))
+    app.router.add_route('POST', '/api/v1/accounts/1/follow', 
+                         flaky(429, headers={"Retry-After": "0"}))
+    return app
+
+POLICY = atoot.RetryPolicy(backoff=0.01)
+
+async def test_retry_idempotent(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, retry=POLICY) as c:
+        c.base_url = ""
+        assert await c.get_instance() == {"id": "1"}
+        assert cli.server.app["calls"] == 3
+
+async def test_no_retry_for_post(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, retry=POLICY) as c:
+        c.base_url = ""
+        with pytest.raises(atoot.UnavailableError):
+            await c.post('/api/v1/follow_requests/1/authorize')
+        assert cli.server.app["calls"] == 1
+
+async def test_retry_post_after_429(aiohttp_client, loop):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", session=cli, retry=POLICY) as c:
+        c.base_url = ""
+        assert await c.account_follow(1) == {"id": "1"}
+        assert cli.server.app["calls"] == 3
+
+def test_policy_overrides():
+    policy = atoot.RetryPolicy(overrides={"POST /api/v1/media": None,
+                                          "/api/v1/statuses": POLICY})
+    assert policy.for_request("POST", "/api/v1/media") is None
+    assert policy.for_request("GET", "/api/v1/media/1") is policy
+    assert policy.for_request("GET", "/api/v1/statuses/1?x=1") is POLICY
+    assert policy.delay(1, 429, {"Retry-After": "3"}) == 3
+    assert policy.delay(1, 503, {"Retry-After": "3000"}) is None
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import pytest
+import aiohttp
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+def update(_id):
+    return json.dumps({"event": "update", 
+                       "payload": json.dumps({"id": str(_id)})})
+
+async def streaming(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    request.app["connections"] += 1
+    if request.app["connections"] == 1:
+        await ws.send_str(update(1))
+    else:
+        await ws.send_str(update(3))
+        await ws.send_str(update(4))
+    await ws.close()
+    return ws
+
+async def home(request):
+    assert request.query["min_id"] == "1"
+    return web.json_response([{"id": "3"}, {"id": "2"}])
+
+def create_app(loop):
+    app = web.Application(loop=loop)
+    app["connections"] = 0
+    app.router.add_route('GET', '/api/v1/streaming/', streaming)
+    app.router.add_route('GET', '/api/v1/timelines/home', home)
+    return app
+
+@pytest.mark.parametrize("model", [False, True])
+async def test_managed_stream_backfill(aiohttp_client, loop, model):
+    cli = await aiohttp_client(create_app)
+    async with atoot.client("test", access_token="test", session=cli,
+                            model=model) as c:
+        c.base_url = ""
+        stream = c.managed_stream("user", backoff=0.01)
+        ids = []
+        async for event in stream:
+            ids.append(event.payload["id"])
+            if len(ids) == 4:
+                break
+        assert ids == ["1", "2", "3", "4"]
+        assert stream.reconnects == 1
+
+async def multiplexed(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    async for msg in ws:
+        data = msg.json()
+        request.app["messages"].append(data)
+        if data["type"] == "subscribe":
+            stream = [data["stream"]] + ([data["tag"]] if "tag" in data else [])
+            await ws.send_str(json.dumps({"stream": stream, "event": "update",
+                    "payload": json.dumps({"id": data.get("tag", "home")})}))
+    return ws
+
+async def test_multiplexer(aiohttp_client, loop):
+    app = web.Application()
+    app["messages"] = []
+    app.router.add_route('GET', '/api/v1/streaming/', multiplexed)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        async with c.stream_multiplexer() as mux:
+            python = await mux.subscribe("hashtag", tag_filter="Python")
+            home = await mux.subscribe("user")
+            assert (await python.get()).payload["id"] == "Python"
+            assert (await home.get()).payload["id"] == "home"
+
+            await python.unsubscribe()
+            assert [e async for e in python] == []
+            # the server replies in order, unsubscribe is processed by now
+            public = await mux.subscribe("public")
+            await public.get()
+            assert {"type": "unsubscribe", "stream": "hashtag", 
+                    "tag": "Python"} in app["messages"]
+
+async def silent(request):
+    # doesn't answer pings, like a half-open connection
+    ws = web.WebSocketResponse(autoping=False)
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            await ws.send_str(json.dumps({"stream": ["user"], 
+                    "event": "update", "payload": json.dumps({"id": "1"})}))
+    return ws
+
+async def test_multiplexer_heartbeat(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', silent)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        async with c.stream_multiplexer(heartbeat=0.1, backoff=0.01) as mux:
+            home = await mux.subscribe("user")
+            await home.get()
+            # the stream is subscribed again on a new connection
+            await asyncio.wait_for(home.get(), 5)
+            assert mux.reconnects >= 1
+
+def test_lazy_stream_event():
+    from atoot.streaming import StreamEvent, _UNSET
+    event = StreamEvent.from_message(json.dumps({"stream": ["hashtag", "a"],
+        "event": "update", "payload": json.dumps({"id": "1", 
+                                                  "event": "fake"})}))
+    assert event.event == "update"
+    assert event.stream == ["hashtag", "a"]
+    assert event._payload is _UNSET and event._message is None
+    assert event.payload == {"id": "1", "event": "fake"}
+    assert event.json()["event"] == "update"
+
+async def mixed(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    await ws.send_str(json.dumps({"event": "delete", "payload": "1"}))
+    await ws.send_str(update(2))
+    await ws.close()
+    return ws
+
+async def test_streaming_event_filter(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', mixed)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        async with c.streaming("user") as stream:
+            assert [e.event async for e in stream] == ["delete", "update"]
+        async with c.streaming("user", events=["update"]) as stream:
+            assert [e.payload["id"] async for e in stream] == ["2"]
+
+def test_sse_parser_split_chunks():
+    from atoot.streaming import SSEParser
+    body = (b": thump\n\nevent: delete\ndata: 1\n\n"
+            b"event: update\ndata: {\"id\": \"2\"}\r\n\r\n")
+    parser = SSEParser(events={"update"})
+    events = []
+    for i in range(0, len(body), 5):
+        events.extend(parser.feed(body[i:i + 5]))
+    assert [(e.event, e.payload) for e in events] == [("update", {"id": "2"})]
+
+async def no_websocket(request):
+    return web.Response(status=400)
+
+async def sse_user(request):
+    assert request.headers["Authorization"] == "Bearer test"
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await resp.prepare(request)
+    await resp.write(b"event: update\ndata: {\"id\": ")
+    await resp.write(b"\"5\"}\n\n")
+    await resp.write_eof()
+    return resp
+
+async def test_streaming_sse_fallback(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', no_websocket)
+    app.router.add_route('GET', '/api/v1/streaming/user', sse_user)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        async with c.streaming("user") as stream:
+            assert stream.transport == "sse"
+            assert [e.payload["id"] async for e in stream] == ["5"]
+
+async def revoked_home(request):
+    return web.json_response({"error": "The access token was revoked"}, 
+                             status=401)
+
+async def test_managed_stream_fatal_backfill_error(aiohttp_client, loop):
+    app = web.Application()
+    app["connections"] = 0
+    app.router.add_route('GET', '/api/v1/streaming/', streaming)
+    app.router.add_route('GET', '/api/v1/timelines/home', revoked_home)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        stream = c.managed_stream("user", backoff=0.01)
+        ids = []
+        with pytest.raises(atoot.UnauthorizedError):
+            async for event in stream:
+                ids.append(event.payload["id"])
+        assert ids == ["1"] and stream.reconnects == 1
+
+async def rejected(request):
+    return web.json_response({"error": "Invalid access token"}, status=401)
+
+async def test_multiplexer_rejected_token(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', rejected)
+    cli = await aiohttp_client(app)
+    async with atoot.client("test", access_token="bad", session=cli) as c:
+        c.base_url = ""
+        async with c.stream_multiplexer() as mux:
+            home = await mux.subscribe("user")
+            with pytest.raises(aiohttp.WSServerHandshakeError):
+                await home.get()
+            with pytest.raises(aiohttp.WSServerHandshakeError):
+                async for event in home:
+                    pass
+            assert mux.error.status == 401
+            with pytest.raises(aiohttp.WSServerHandshakeError):
+                await mux.subscribe("public")
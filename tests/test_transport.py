@@ -0,0 +1,55 @@
+import json
+import pytest
+import atoot
+from aiohttp import web
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def home(request):
+    page = int(request.query.get("page", 0))
+    headers = {"X-RateLimit-Remaining": str(299 - page)}
+    if page < 2:
+        headers["Link"] = '</api/v1/timelines/home?page=%d>; rel="next"' % (
+                page + 1)
+    return web.json_response([{"id": str(page)}], headers=headers)
+
+async def status(request):
+    return web.json_response({"error": "Record not found"}, status=404)
+
+async def streaming(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    for i in range(3):
+        await ws.send_str(json.dumps({"event": "delete", "payload": str(i)}))
+    await ws.close()
+    return ws
+
+async def test_record_replay(aiohttp_client, loop, tmp_path):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/timelines/home', home)
+    app.router.add_route('GET', '/api/v1/statuses/{id}/', status)
+    app.router.add_route('GET', '/api/v1/streaming/', streaming)
+    cli = await aiohttp_client(app)
+    path = str(tmp_path / "traffic.jsonl.gz")
+
+    async def session(c):
+        pages = await c.get_all(c.home_timeline(local=True))
+        try:
+            await c.view_status("1")
+        except atoot.NotFoundError as e:
+            error = e.args
+        async with c.streaming("user", transport="websocket") as stream:
+            events = [e.payload async for e in stream]
+        return pages, c.ratelimit_remaining, error, events
+
+    async with atoot.client("test", access_token="test", 
+            session=atoot.RecordingSession(path, cli)) as c:
+        c.base_url = ""
+        recorded = await session(c)
+    assert recorded[0] == [{"id": "0"}, {"id": "1"}, {"id": "2"}]
+
+    async with atoot.client("other.host", access_token="other",
+            session=atoot.ReplaySession(path)) as c:
+        assert await session(c) == recorded
+        assert await session(c) == recorded
+        with pytest.raises(atoot.NetworkError):
+            await c.home_timeline()
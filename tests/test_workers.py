@@ -0,0 +1,77 @@
+import asyncio
+import json
+import random
+import atoot
+from aiohttp import web
+from atoot.streaming import WorkQueue, run_workers
+pytest_plugins = 'aiohttp.pytest_plugin'
+
+async def test_overflow_policies(loop):
+    queue = WorkQueue(2, "drop-oldest")
+    for i in range(3):
+        await queue.put(i)
+    assert [await queue.get(), await queue.get()] == [1, 2]
+    assert queue.dropped == 1
+
+    queue = WorkQueue(2, "coalesce", key=lambda i: i[0])
+    for item in (("a", 1), ("b", 1), ("a", 2), ("c", 1)):
+        await queue.put(item)
+    assert [await queue.get(), await queue.get()] == [("b", 1), ("c", 1)]
+    assert (queue.coalesced, queue.dropped) == (1, 1)
+
+async def test_run_workers_concurrency_and_order(loop):
+    active = []
+    seen = {}
+    peak = 0
+
+    async def source():
+        for i in range(40):
+            yield (i % 4, i)
+
+    async def handler(item):
+        nonlocal peak
+        active.append(item)
+        peak = max(peak, len(active))
+        await asyncio.sleep(0.001)
+        active.remove(item)
+        seen.setdefault(item[0], []).append(item[1])
+
+    await run_workers(source(), handler, 4, queue_size=8, 
+                      key=lambda item: item[0])
+    assert peak > 1
+    assert all(v == sorted(v) for v in seen.values())
+    assert sum(len(v) for v in seen.values()) == 40
+
+async def events(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    for i in range(40):
+        await ws.send_str(json.dumps({"stream": ["user"], "event": "update",
+                "payload": json.dumps({"id": str(i), "account": i % 4})}))
+    await ws.close()
+    return ws
+
+async def test_streaming_handler_workers(aiohttp_client, loop):
+    app = web.Application()
+    app.router.add_route('GET', '/api/v1/streaming/', events)
+    cli = await aiohttp_client(app)
+    seen = {}
+    running = peak = 0
+
+    async def handler(client, event):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(random.random() / 100)
+        running -= 1
+        seen.setdefault(event.payload["account"], []).append(
+                int(event.payload["id"]))
+
+    async with atoot.client("test", access_token="test", session=cli) as c:
+        c.base_url = ""
+        await asyncio.wait_for(c.streaming_handler("user", handler, 
+                workers=4, key=lambda e: e.payload["account"]), 5)
+    assert peak > 1
+    assert sorted(seen) == [0, 1, 2, 3]
+    assert all(v == sorted(v) for v in seen.values())
+    assert sorted(i for v in seen.values() for i in v) == list(range(40))